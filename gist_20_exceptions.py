@@ -4,3 +4,27 @@ class MissingCredentialsException(Exception):
 
 class SimpleHTTPError(Exception):
     pass
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class RateLimitExceeded(SimpleHTTPError):
+    """GitHub API quota is spent, or kept for interactive requests, until reset time"""
+
+    def __init__(self, reset=None):
+        super().__init__('API rate limit exceeded')
+        self.reset = reset
+
+
+class HostUnavailable(SimpleHTTPError):
+    """Requests to the host failed repeatedly, it is not asked again for a while"""
+
+    def __init__(self, host):
+        super().__init__('{} is not available'.format(host))
+        self.host = host
+
+
+class GitError(Exception):
+    pass
@@ -0,0 +1,129 @@
+import sys
+
+# fields of Gist object of GitHub GraphQL API that GistSummary.from_graphql reads
+GIST_GRAPHQL_FRAGMENT = '''
+fragment gistSummary on Gist {
+  name
+  url
+  description
+  updatedAt
+  owner { login }
+  files(limit: 100) { name size language { name } }
+}
+'''
+
+
+def intern(value):
+    # languages, types and logins repeat across thousands of listed gists
+    return sys.intern(value) if value is not None else None
+
+
+class GistFile:
+    """File of a listed gist, without content"""
+
+    __slots__ = ('filename', 'type', 'language', 'size')
+
+    def __init__(self, filename, media_type=None, language=None, size=None):
+        self.filename = filename
+        self.type = media_type
+        self.language = language
+        self.size = size
+
+    @classmethod
+    def from_json(cls, filename, data):
+        return cls(
+            filename,
+            intern(data.get('type')),
+            intern(data.get('language')),
+            data.get('size'),
+        )
+
+    @classmethod
+    def from_graphql(cls, data):
+        """GraphQL API gives no media type of gist files"""
+        return cls(
+            data['name'],
+            None,
+            intern((data.get('language') or {}).get('name')),
+            data.get('size'),
+        )
+
+    def to_json(self):
+        return {'type': self.type, 'language': self.language, 'size': self.size}
+
+
+class GistSummary:
+    """Fields of a gist the plugin uses, built from a gist of GitHub API response"""
+
+    __slots__ = (
+        'id',
+        'url',
+        'html_url',
+        'description',
+        'owner_login',
+        'updated_at',
+        'files',
+    )
+
+    def __init__(
+        self,
+        gist_id,
+        url=None,
+        html_url=None,
+        description=None,
+        owner_login=None,
+        updated_at=None,
+        files=(),
+    ):
+        self.id = gist_id
+        self.url = url
+        self.html_url = html_url
+        self.description = description
+        self.owner_login = owner_login
+        self.updated_at = updated_at
+        self.files = files  # tuple of GistFile in the order of the response
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            data.get('id'),
+            data.get('url'),
+            data.get('html_url'),
+            data.get('description'),
+            intern((data.get('owner') or {}).get('login')),
+            data.get('updated_at'),
+            tuple(
+                GistFile.from_json(filename, file_data)
+                for filename, file_data in (data.get('files') or {}).items()
+            ),
+        )
+
+    @classmethod
+    def from_graphql(cls, data, api_url):
+        """Builds summary from GIST_GRAPHQL_FRAGMENT fields, url is REST API URL of the gist"""
+        return cls(
+            data['name'],
+            '{}/gists/{}'.format(api_url, data['name']),
+            data.get('url'),
+            data.get('description'),
+            intern((data.get('owner') or {}).get('login')),
+            data.get('updatedAt'),
+            tuple(
+                GistFile.from_graphql(file_data)
+                for file_data in data.get('files') or ()
+            ),
+        )
+
+    def to_json(self):
+        """Returns the fields in the format of GitHub API, from_json accepts it back"""
+        return {
+            'id': self.id,
+            'url': self.url,
+            'html_url': self.html_url,
+            'description': self.description,
+            'owner': {'login': self.owner_login} if self.owner_login else None,
+            'updated_at': self.updated_at,
+            'files': dict(
+                (gist_file.filename, gist_file.to_json()) for gist_file in self.files
+            ),
+        }
@@ -0,0 +1,123 @@
+import contextlib
+import socket
+import threading
+
+from gist_20_exceptions import RequestCancelled
+
+INTERACTIVE = 0  # the user waits for the result, e.g. opening or saving a gist
+BACKGROUND = 1  # refreshing caches and indexing, may be throttled or deferred
+
+request_context = threading.local()
+REQUEST_OPTIONS = {
+    'priority': INTERACTIVE,
+    'timeout': None,  # (connect, read) seconds, None for the timeouts of transport
+    'cancelled': None,  # CancelToken aborting the requests
+}
+
+
+def request_option(name):
+    return getattr(request_context, name, REQUEST_OPTIONS[name])
+
+
+def current_priority():
+    return request_option('priority')
+
+
+@contextlib.contextmanager
+def request_options(**options):
+    """Requests sent by the current thread inside the block use the options"""
+    previous = dict((name, request_option(name)) for name in options)
+
+    for name, value in options.items():
+        setattr(request_context, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(request_context, name, value)
+
+
+def request_priority(priority):
+    return request_options(priority=priority)
+
+
+def request_timeout(connect, read):
+    return request_options(timeout=(connect, read))
+
+
+def request_cancellation(cancelled):
+    return request_options(cancelled=cancelled)
+
+
+def inherit_context(fn):
+    """Wraps fn to send its requests with the options of the calling thread"""
+    options = dict((name, request_option(name)) for name in REQUEST_OPTIONS)
+
+    def _fn(*args, **kwargs):
+        with request_options(**options):
+            return fn(*args, **kwargs)
+
+    return _fn
+
+
+class CancelToken(threading.Event):
+    """Event that also aborts requests waiting for network when it is set"""
+
+    def __init__(self):
+        super().__init__()
+        self.connections = set()  # connections blocked in network calls
+        self._connections_lock = threading.Lock()
+
+    def set(self):
+        super().set()
+
+        with self._connections_lock:
+            connections = list(self.connections)
+
+        for connection in connections:
+            abort_connection(connection)
+
+    def watch(self, connection):
+        with self._connections_lock:
+            self.connections.add(connection)
+
+        if self.is_set():
+            abort_connection(connection)
+
+    def unwatch(self, connection):
+        with self._connections_lock:
+            self.connections.discard(connection)
+
+
+def abort_connection(connection):
+    """Wakes up the thread blocked on the socket, closing it from another thread doesn't"""
+    sock = connection.sock
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:  # already closed
+            pass
+
+
+@contextlib.contextmanager
+def cancellable(connection, cancelled):
+    """Raises RequestCancelled when cancelled is set before or while the block runs"""
+    if cancelled is None:
+        yield
+        return
+
+    if cancelled.is_set():
+        raise RequestCancelled()
+
+    cancelled.watch(connection)
+    try:
+        yield
+    except Exception as e:
+        if cancelled.is_set():  # the error is caused by the aborted socket
+            raise RequestCancelled() from e
+        raise
+    finally:
+        cancelled.unwatch(connection)
+
+    if cancelled.is_set():  # the aborted socket may look like the end of body
+        raise RequestCancelled()
@@ -0,0 +1,207 @@
+import codecs
+import itertools
+import json
+import re
+import threading
+import zlib
+from collections import OrderedDict
+
+
+def content_decompressor(response):
+    """Returns zlib decompressor for Content-Encoding of the response, None for plain body"""
+    encoding = (response.getheader('Content-Encoding') or '').strip().lower()
+
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    if encoding == 'deflate':
+        return DeflateDecompressor()
+
+    return None
+
+
+class DeflateDecompressor:
+    """Decodes deflate body, zlib-wrapped as HTTP says or raw as some servers send it
+
+    The format is told by the first two bytes, a zlib header is a multiple of 31.
+    """
+
+    def __init__(self):
+        self.decompressor = None
+        self.head = b''
+
+    def decompress(self, data):
+        if self.decompressor is None:
+            self.head += data
+            if len(self.head) < 2:
+                return b''
+            data, self.head = self.head, b''
+            self.decompressor = zlib.decompressobj(
+                zlib.MAX_WBITS if is_zlib_header(data) else -zlib.MAX_WBITS
+            )
+
+        return self.decompressor.decompress(data)
+
+    def flush(self):
+        if self.decompressor is None:  # the body is shorter than a zlib header
+            self.decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self.decompressor.decompress(self.head) + self.decompressor.flush()
+
+        return self.decompressor.flush()
+
+
+def is_zlib_header(data):
+    return data[0] & 0x0F == 8 and (data[0] << 8 | data[1]) % 31 == 0
+
+
+def decompress_body(response, payload):
+    decompressor = content_decompressor(response)
+
+    if decompressor is None:
+        transfer_counter.add(len(payload), len(payload))
+        return payload
+
+    decoded = decompressor.decompress(payload) + decompressor.flush()
+    transfer_counter.add(len(payload), len(decoded))
+    return decoded
+
+
+class TransferCounter:
+    """Counts bytes received over network and bytes of response bodies they were decoded to"""
+
+    def __init__(self):
+        self.received = 0
+        self.decoded = 0
+        self._lock = threading.Lock()
+
+    def add(self, received, decoded):
+        with self._lock:
+            self.received += received
+            self.decoded += decoded
+
+    def reset(self):
+        with self._lock:
+            self.received = self.decoded = 0
+
+
+transfer_counter = TransferCounter()
+
+
+class ResponseCache:
+    """LRU cache of GET response bodies with their validators for conditional requests"""
+
+    def __init__(self, max_entries=200, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()  # key -> (etag, last_modified, payload, link)
+        self._lock = threading.Lock()
+
+    def configure(self, max_entries, max_bytes):
+        with self._lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, last_modified, payload, link=None):
+        """link is the Link header of the response, 304 replies don't repeat it"""
+        with self._lock:
+            self._discard(key)
+            if len(payload) > self.max_bytes:
+                return
+            self._entries[key] = (etag, last_modified, payload, link)
+            self.size += len(payload)
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[2])
+
+    def _evict(self):
+        while self._entries and (
+            len(self._entries) > self.max_entries or self.size > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self.size -= len(entry[2])
+
+
+response_cache = ResponseCache()
+
+
+def cached_chunks(chunks, cache_key, etag, last_modified, link=None):
+    """Passes chunks through, the body is cached once it was read completely"""
+    received = []
+
+    for chunk in chunks:
+        received.append(chunk)
+        yield chunk
+
+    response_cache.put(cache_key, etag, last_modified, b''.join(received), link)
+
+
+JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def json_array_items(chunks):
+    """Yields elements of a JSON array given in chunks of bytes as soon as they are complete"""
+    decoder = codecs.getincrementaldecoder('utf8')('ignore')
+    json_decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    text = ''
+    started = False
+
+    for chunk in itertools.chain(chunks, [None]):
+        if chunk is None:
+            text += decoder.decode(b'', final=True)
+        else:
+            text += decoder.decode(chunk)
+        position = 0
+
+        while True:
+            position = JSON_WHITESPACE.match(text, position).end()
+            if position == len(text):
+                break
+
+            if not started:
+                if text[position] != '[':
+                    raise ValueError('JSON array expected: {!r}'.format(text[:100]))
+                started = True
+                position += 1
+                continue
+
+            if text[position] == ']':
+                for _ in chunks:  # read up to the end, so the connection is reused
+                    pass
+                return
+
+            if text[position] == ',':
+                position += 1
+                continue
+
+            try:
+                item, end = json_decoder.raw_decode(text, position)
+            except ValueError:  # the element is not received completely yet
+                break
+
+            if end == len(text):  # e.g. a number may continue in the next chunk
+                break
+
+            yield item
+            position = end
+
+        text = text[position:]
+
+    raise ValueError('JSON array is not complete')
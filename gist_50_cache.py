@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+
+class DiskCache:
+    """Keeps JSON responses in files between sessions, one file per key"""
+
+    def __init__(self, directory=None, ttl=300, max_bytes=32 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def configure(self, directory, ttl, max_bytes):
+        with self._lock:
+            self.directory = directory
+            self.ttl = ttl
+            self.max_bytes = max_bytes
+
+        self.prune()
+
+    def path(self, key):
+        filename = hashlib.sha1(key.encode('utf8')).hexdigest() + '.json'
+        return os.path.join(self.directory, filename)
+
+    def get(self, key):
+        """Returns (value, fresh), value is None when the key is not cached"""
+        if not self.directory:
+            return None, False
+
+        try:
+            with open(self.path(key), encoding='utf8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None, False
+
+        return entry['value'], time.time() - entry['stored_at'] < self.ttl
+
+    def set(self, key, value):
+        self._store(key, value, time.time())
+        self.prune()
+
+    def invalidate(self, key):
+        """Marks entry as stale, so it is refreshed the next time it is used"""
+        value, _ = self.get(key)
+
+        if value is not None:
+            self._store(key, value, 0)
+
+    def delete(self, key):
+        """Removes entry, so it is not used even as stale data"""
+        if not self.directory:
+            return
+
+        with self._lock:
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def _store(self, key, value, stored_at):
+        if not self.directory or not self.max_bytes:
+            return
+
+        path = self.path(key)
+        tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf8') as f:
+                json.dump({'stored_at': stored_at, 'value': value}, f)
+            os.replace(tmp_path, path)  # readers never see a partially written file
+
+    def prune(self):
+        """Removes least recently stored entries until the cache fits into max_bytes"""
+        with self._lock:
+            if not self.directory or not os.path.isdir(self.directory):
+                return
+
+            entries = []
+            for filename in os.listdir(self.directory):
+                stat = os.stat(os.path.join(self.directory, filename))
+                entries.append((stat.st_mtime, stat.st_size, filename))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, filename in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                os.remove(os.path.join(self.directory, filename))
+                total -= size
+
+    def clear(self):
+        with self._lock:
+            if not self.directory or not os.path.isdir(self.directory):
+                return
+
+            for filename in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, filename))
+
+
+disk_cache = DiskCache()
+
+
+class GistMirror:
+    """Local copies of opened gist files, written by a background thread
+
+    Files are laid out as <directory>/<gist id>/<file name>. All writes queued
+    while the writer is busy are written in one go, a newer write of a file
+    replaces the older one that is not written yet.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.pending = OrderedDict()  # path -> (text, on_written)
+        self.writing = False
+        self.condition = threading.Condition()
+        self.worker = None
+
+    def path(self, gist_id, gist_filename):
+        return os.path.join(self.directory, gist_id, gist_filename)
+
+    def write(self, path, text, on_written=None):
+        """Queues the text to be written to path, on_written is called from the writer"""
+        with self.condition:
+            self.pending.pop(path, None)
+            self.pending[path] = (text, on_written)
+
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.work, daemon=True)
+                self.worker.start()
+
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Waits until all queued files are written"""
+        with self.condition:
+            return self.condition.wait_for(
+                lambda: not self.pending and not self.writing, timeout
+            )
+
+    def work(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+                batch, self.pending = self.pending, OrderedDict()
+                self.writing = True
+
+            for path, (text, on_written) in batch.items():
+                try:
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    # newlines are kept as they are in the view
+                    with open(path, 'w', encoding='utf8', newline='') as f:
+                        f.write(text)
+                except:  # the writer must survive a failed write
+                    traceback.print_exc()
+                    continue
+
+                if on_written is not None:
+                    on_written()
+
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+gist_mirror = GistMirror()
@@ -0,0 +1,165 @@
+import base64
+import os
+import shutil
+import subprocess
+import threading
+
+from gist_20_exceptions import GitError
+
+
+class GitWorkspace:
+    """Local git clones of opened gists, laid out as <directory>/<gist id>
+
+    A clone never keeps unpushed commits: it is reset to the remote branch
+    after every fetch and after a failed push, so its HEAD is always a
+    version of the gist that GitHub has.
+    """
+
+    author = ('Gist', 'gist@users.noreply.github.com')
+
+    def __init__(self, directory=None, git='git', timeout=60):
+        self.directory = directory
+        self.git = git
+        self.timeout = timeout
+        self._lock = threading.Lock()  # one git command changes the clones at a time
+
+    def path(self, gist_id):
+        return os.path.join(self.directory, gist_id)
+
+    def exists(self, gist_id):
+        return bool(self.directory) and os.path.isdir(
+            os.path.join(self.path(gist_id), '.git')
+        )
+
+    def environment(self, token=None, https_proxy=None):
+        """Credentials are passed in the environment, never on the command line"""
+        env = dict(os.environ)
+        env['GIT_TERMINAL_PROMPT'] = '0'  # fail instead of waiting for a password
+        name, email = self.author
+        env.update(
+            GIT_AUTHOR_NAME=name,
+            GIT_AUTHOR_EMAIL=email,
+            GIT_COMMITTER_NAME=name,
+            GIT_COMMITTER_EMAIL=email,
+        )
+
+        if token:
+            credentials = base64.b64encode(
+                '{}:x-oauth-basic'.format(token).encode('utf8')
+            ).decode('ascii')
+            env['GIT_CONFIG_COUNT'] = '1'
+            env['GIT_CONFIG_KEY_0'] = 'http.extraHeader'
+            env['GIT_CONFIG_VALUE_0'] = 'Authorization: Basic ' + credentials
+
+        if https_proxy:
+            env['https_proxy'] = https_proxy
+
+        return env
+
+    def run(self, args, cwd=None, token=None, https_proxy=None):
+        """Runs git with args and returns its output, raises GitError when it fails"""
+        command = [self.git, '-c', 'core.autocrlf=false'] + list(args)
+        startupinfo = None
+
+        if os.name == 'nt':  # no console window flashing for every command
+            startupinfo = subprocess.STARTUPINFO()
+            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+        with subprocess.Popen(
+            command,
+            cwd=cwd,
+            env=self.environment(token, https_proxy),
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            startupinfo=startupinfo,
+        ) as process:
+            try:
+                out, err = process.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.communicate()
+                raise GitError('git {} timed out'.format(args[0])) from None
+
+        if process.returncode != 0:
+            raise GitError(
+                'git {} failed: {}'.format(
+                    args[0], err.decode('utf8', 'replace').strip()
+                )
+            )
+
+        return out.decode('utf8', 'replace')
+
+    def sync(self, gist_id, pull_url, token=None, https_proxy=None):
+        """Clones the gist, or fetches it and moves the clone to the fetched version"""
+        path = self.path(gist_id)
+
+        with self._lock:
+            if not self.exists(gist_id):
+                os.makedirs(self.directory, exist_ok=True)
+                try:
+                    self.run(
+                        ['clone', '--quiet', pull_url, path], None, token, https_proxy
+                    )
+                except:
+                    shutil.rmtree(path, ignore_errors=True)  # next sync clones again
+                    raise
+                return
+
+            self.run(['fetch', '--quiet', 'origin'], path, token, https_proxy)
+            self.run(['reset', '--quiet', '--hard', '@{upstream}'], path)
+
+    def head(self, gist_id):
+        """Returns the version of the gist in the clone, None when it is not cloned"""
+        if not self.exists(gist_id):
+            return None
+
+        return self.run(['rev-parse', 'HEAD'], self.path(gist_id)).strip()
+
+    def files(self, gist_id):
+        """Returns names of the files in the clone"""
+        output = self.run(['ls-files', '-z'], self.path(gist_id))
+        return [filename for filename in output.split('\0') if filename]
+
+    def read(self, gist_id, filename, chunk_size=64 * 1024):
+        """Yields text of a file of the clone in chunks"""
+        path = os.path.join(self.path(gist_id), filename)
+
+        # newlines are kept as they are in the gist
+        with open(path, encoding='utf8', errors='replace', newline='') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+    def commit(self, gist_id, contents, token=None, https_proxy=None):
+        """Writes contents, a filename -> text dict, and pushes them as one commit
+
+        The clone is reset to the remote branch when the commit or the push
+        fails, e.g. when the gist was changed elsewhere since it was fetched.
+        """
+        path = self.path(gist_id)
+
+        with self._lock:
+            try:
+                for filename, text in contents.items():
+                    with open(
+                        os.path.join(path, filename), 'w', encoding='utf8', newline=''
+                    ) as f:
+                        f.write(text)
+
+                self.run(['add', '--'] + list(contents), path)
+                if not self.run(['status', '--porcelain'], path).strip():
+                    return  # nothing changed
+
+                self.run(['commit', '--quiet', '--allow-empty-message', '-m', ''], path)
+                self.run(
+                    ['push', '--quiet', 'origin', 'HEAD'], path, token, https_proxy
+                )
+            except:
+                self.run(['reset', '--quiet', '--hard', '@{upstream}'], path)
+                raise
+
+
+git_workspace = GitWorkspace()
@@ -1,5 +1,8 @@
+import hashlib
 import os
+import queue
 import re
+import threading
 
 try:
     import sublime
@@ -7,6 +10,109 @@ except ImportError:
     from test.stubs import sublime
 
 
+class StatusSpinner:
+    """Shows animated message in the status bar until it is stopped"""
+
+    frames = '|/-\\'
+
+    def __init__(self, message, interval=100):
+        self.message = message
+        self.interval = interval
+        self.running = False
+
+    def start(self):
+        self.running = True
+        self.tick(0)
+
+    def stop(self):
+        self.running = False
+
+    def tick(self, frame):
+        if not self.running:
+            return
+
+        sublime.status_message(
+            '{} {}'.format(self.message, self.frames[frame % len(self.frames)])
+        )
+        sublime.set_timeout(lambda: self.tick(frame + 1), self.interval)
+
+
+class ViewLoader:
+    """Appends text to a view in bounded slices, one slice per UI tick
+
+    Text is written from a background thread as it arrives, the view is
+    read-only and shows progress in the status bar until it is closed. Only
+    max_pending slices wait for the UI thread, write() blocks until it
+    catches up, so a large file is never copied into the queue as a whole.
+    """
+
+    slice_size = 128 * 1024  # characters per append command
+    max_pending = 8  # slices waiting to be appended
+
+    def __init__(self, view, name, size=None):
+        self.view = view
+        self.name = name
+        self.size = size
+        self.loaded = 0
+        self.pending = queue.Queue(self.max_pending)  # slices and the on-close callback
+        self.scheduled = False  # whether append_next is queued on the UI thread
+        self._lock = threading.Lock()
+        view.set_read_only(True)
+
+    def write(self, text):
+        for start in range(0, len(text), self.slice_size):
+            self.pending.put(text[start : start + self.slice_size])
+            self.schedule()
+
+    def close(self, on_done=None):
+        """Makes the view editable once all the text is appended, then calls on_done"""
+
+        def done():
+            self.view.set_read_only(False)
+            if on_done is not None:
+                on_done()
+
+        self.pending.put(done)
+        self.schedule()
+
+    def schedule(self):
+        with self._lock:
+            if self.scheduled:
+                return
+            self.scheduled = True
+
+        sublime.set_timeout(self.append_next, 0)
+
+    def append_next(self):
+        """Appends one slice, the next one is appended on the next tick"""
+        with self._lock:
+            try:
+                item = self.pending.get_nowait()
+            except queue.Empty:
+                self.scheduled = False
+                return
+
+        if callable(item):
+            item()
+        else:
+            self.append(item)
+
+        sublime.set_timeout(self.append_next, 0)
+
+    def append(self, part):
+        # read-only view accepts forced appends only
+        self.view.run_command('append', {'characters': part, 'force': True})
+        self.loaded += len(part)
+        sublime.status_message(self.progress())
+
+    def progress(self):
+        if self.size:  # size is in bytes, so the percentage is approximate
+            percent = min(100 * self.loaded // self.size, 100)
+            return 'Gist: loading {} {}%'.format(self.name, percent)
+
+        return 'Gist: loading {} {} KB'.format(self.name, self.loaded // 1024)
+
+
 def gistify_view(view, gist, gist_filename):
     statusline_string = "Gist: " + gist_title(gist)[0]
 
@@ -15,9 +121,9 @@ def gistify_view(view, gist, gist_filename):
     elif os.path.basename(view.file_name()) != gist_filename:
         statusline_string = "%s (%s)" % (statusline_string, gist_filename)
 
-    view.settings().set('gist_html_url', gist["html_url"])
-    view.settings().set('gist_description', gist['description'])
-    view.settings().set('gist_url', gist["url"])
+    view.settings().set('gist_html_url', gist.html_url)
+    view.settings().set('gist_description', gist.description)
+    view.settings().set('gist_url', gist.url)
     view.settings().set('gist_filename', gist_filename)
     view.set_status("Gist", statusline_string)
 
@@ -30,17 +136,30 @@ def ungistify_view(view):
     view.erase_status("Gist")
 
 
+def close_view(view):
+    """Closes the view without asking to save it, ST3 has no View.close()"""
+
+    def close():
+        window = view.window()
+        if window is not None:
+            view.set_scratch(True)
+            window.focus_view(view)
+            window.run_command('close_file')
+
+    sublime.set_timeout(close, 0)
+
+
 def gist_title(gist):
     settings = sublime.load_settings('Gist.sublime-settings')
-    description = gist.get('description')
+    description = gist.description
 
     if description and settings.get('prefer_filename') is False:
         title = description
     else:
-        title = list(gist['files'].keys())[0]
+        title = gist.files[0].filename
 
     if settings.get('show_authors'):
-        return [title, gist.get('owner').get('login')]
+        return [title, gist.owner_login]
 
     return [title]
 
@@ -62,11 +181,11 @@ def gists_filter(all_gists, name_prefix=''):
     gists_names = []
 
     for gist in all_gists:
-        name = gist_title(gist)
-
-        if not gist['files']:
+        if not gist.files:
             continue
 
+        name = gist_title(gist)
+
         if prefix:
             if name[0][0:prefix_len] == prefix:
                 name[0] = name[0][prefix_len:]  # remove prefix from name
@@ -109,3 +228,7 @@ def set_syntax(view, file_data):
         new_syntax_path = new_syntax_path.replace('\\', '/')
 
     view.set_syntax_file(new_syntax_path)
+
+
+def content_digest(text):
+    return hashlib.sha1(text.encode('utf8')).hexdigest()
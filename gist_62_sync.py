@@ -0,0 +1,386 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+try:
+    import sublime
+except ImportError:
+    from test.stubs import sublime
+
+from gist_20_exceptions import GitError, HostUnavailable, RateLimitExceeded
+from gist_30_models import GIST_GRAPHQL_FRAGMENT, GistSummary
+from gist_35_context import BACKGROUND, request_priority
+from gist_40_request import (
+    api_graphql,
+    api_request_pages,
+    api_request_raw,
+    api_response,
+)
+from gist_50_cache import disk_cache
+from gist_55_git import git_workspace
+
+refreshing = set()  # keys of data being refreshed in background
+refreshing_lock = threading.Lock()
+
+
+def cache_key(url):
+    # responses differ per account, token is hashed into the cache file name
+    settings = sublime.load_settings('Gist.sublime-settings')
+    return '{} {}'.format(settings.get('token'), url)
+
+
+def cached_api_request(url, max_items=None, on_update=None):
+    """Returns cached list at once, stale list is refreshed in background
+
+    Without cache all pages of the list are waited for. When on_update is given
+    only the first page is, the rest of pages is fetched in background and
+    on_update is called with the whole list.
+    """
+    value, fresh = read_list(url)
+
+    if value is not None:
+        if not fresh:
+            refresh_cache(url, max_items)
+        return value
+
+    pages = api_request_pages(url, max_items)
+
+    if on_update is None:
+        value = list_items(url, pages)
+        store_list(url, value, time.time())
+        return value
+
+    first_page = list_items(url, [next(pages)])
+
+    def load_rest():
+        try:
+            items = first_page + list_items(url, pages)
+        except:
+            traceback.print_exc()
+            return
+
+        store_list(url, items, time.time())
+
+        if len(items) > len(first_page):
+            sublime.set_timeout(lambda: on_update(items), 0)
+
+    threading.Thread(target=load_rest).start()
+
+    return first_page
+
+
+def refresh_cache(url, max_items=None):
+    run_in_background(cache_key(url), lambda: sync_list(url, max_items))
+
+
+def run_in_background(key, fn):
+    """Runs fn on a background thread with low priority, unless fn of the key is running
+
+    Stale data is still good enough when it fails, e.g. when offline. When
+    the rate limit is spent, fn is run again the next time the data is used.
+    """
+    with refreshing_lock:
+        if key in refreshing:
+            return
+        refreshing.add(key)
+
+    def run():
+        try:
+            with request_priority(BACKGROUND):
+                fn()
+        except RateLimitExceeded:
+            pass
+        except:
+            traceback.print_exc()
+        finally:
+            with refreshing_lock:
+                refreshing.discard(key)
+
+    threading.Thread(target=run).start()
+
+
+def is_gist_list(url):
+    """Whether items of the list are gists"""
+    return urlsplit(url).path.endswith(('/gists', '/gists/starred'))
+
+
+def accepts_since(url):
+    """Whether since parameter of the list returns the gists added since then
+
+    Starred gists are filtered by their updated_at, not by when they were
+    starred, so an older gist starred on github.com would never be returned.
+    """
+    return urlsplit(url).path.endswith('/gists')
+
+
+def list_items(url, pages):
+    """Returns items of the pages, gists are parsed into GistSummary page by page"""
+    if is_gist_list(url):  # only one page of API dicts is kept in memory
+        return [GistSummary.from_json(item) for page in pages for item in page]
+
+    return [item for page in pages for item in page]
+
+
+def read_list(url):
+    """Returns (items, fresh) of the cached list, items is None when it's not cached"""
+    items, fresh = disk_cache.get(cache_key(url))
+
+    if items is not None and is_gist_list(url):
+        items = [GistSummary.from_json(item) for item in items]
+
+    return items, fresh
+
+
+def sync_list(url, max_items=None):
+    """Updates the cached list, only gists changed since the last sync are fetched
+
+    Deleted gists are not returned by since requests, so the whole list is
+    fetched again every full_sync_interval seconds. Lists that don't accept
+    since are always fetched whole.
+    """
+    gists, _ = read_list(url)
+    state, _ = disk_cache.get(cache_key(url) + ' sync')
+    settings = sublime.load_settings('Gist.sublime-settings')
+    full_sync_interval = settings.get('full_sync_interval', 3600)
+
+    if (
+        gists is not None
+        and accepts_since(url)
+        and state
+        and state['since']
+        and time.time() - state['full_synced_at'] < full_sync_interval
+    ):
+        since_url = url + ('&' if '?' in url else '?') + 'since=' + state['since']
+        changed = list_items(url, api_request_pages(since_url))
+        store_list(url, merge_gists(gists, changed, max_items), state['full_synced_at'])
+    else:
+        store_list(url, list_items(url, api_request_pages(url, max_items)), time.time())
+
+
+def store_list(url, items, full_synced_at):
+    if not is_gist_list(url):
+        disk_cache.set(cache_key(url), items)
+        return
+
+    disk_cache.set(cache_key(url), [gist.to_json() for gist in items])
+
+    # server time of the latest change, local clock may be off
+    since = max([gist.updated_at or '' for gist in items] or [''])
+    disk_cache.set(
+        cache_key(url) + ' sync',
+        {'since': since, 'full_synced_at': full_synced_at},
+    )
+
+
+def merge_gists(gists, changed, max_items=None):
+    """Replaces changed gists in the list, new gists are put first"""
+    changed_by_id = OrderedDict((gist.id, gist) for gist in changed)
+    known_ids = set(gist.id for gist in gists)
+
+    merged = [gist for gist in changed_by_id.values() if gist.id not in known_ids]
+    merged += [changed_by_id.get(gist.id, gist) for gist in gists]
+
+    return merged[:max_items] if max_items is not None else merged
+
+
+ORG_GISTS_QUERY = '''
+query($org: String!, $after: String, $gists: Int!) {
+  organization(login: $org) {
+    membersWithRole(first: 100, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        gists(first: $gists, privacy: PUBLIC, orderBy: {field: UPDATED_AT, direction: DESC}) {
+          nodes { ...gistSummary }
+        }
+      }
+    }
+  }
+}
+''' + GIST_GRAPHQL_FRAGMENT
+
+
+def graphql_org_gists(org, max_items=None):
+    """Returns gists of the org members with one GraphQL query per 100 members
+
+    REST API needs a request per member. GraphQL API returns up to 100 latest
+    gists of every member.
+    """
+    settings = sublime.load_settings('Gist.sublime-settings')
+    key = cache_key('{} {}'.format(settings.get('GRAPHQL_URL'), org))
+    cached, fresh = disk_cache.get(key)
+    if cached is not None and fresh:
+        return [GistSummary.from_json(gist) for gist in cached]
+
+    gists = []
+    after = None
+
+    while True:
+        variables = {'org': org, 'after': after, 'gists': min(max_items or 100, 100)}
+        data = api_graphql(settings.get('GRAPHQL_URL'), ORG_GISTS_QUERY, variables)
+        members = data['organization']['membersWithRole']
+        for member in members['nodes']:
+            gists += [
+                GistSummary.from_graphql(gist, settings.get('api_url'))
+                for gist in member['gists']['nodes']
+            ]
+
+        if not members['pageInfo']['hasNextPage']:
+            break
+        after = members['pageInfo']['endCursor']
+
+    disk_cache.set(key, [gist.to_json() for gist in gists])
+    return gists
+
+
+def fetch_gist(gist_url):
+    """Returns the current gist, the disk cache is always revalidated
+
+    The gist is kept with its ETag, so an unchanged gist is not downloaded
+    again. Cached gist is returned only when GitHub can't be reached, so
+    gists opened before can be opened offline.
+    """
+    key = cache_key(gist_url)
+    gist, _ = disk_cache.get(key)
+    etag, _ = disk_cache.get(key + ' etag') if gist is not None else (None, False)
+
+    try:
+        fetched, response = api_response(gist_url, etag=etag)
+    except (OSError, HostUnavailable):
+        if gist is None:
+            raise
+        traceback.print_exc()
+        return gist
+
+    if fetched is None:  # not modified
+        return gist
+
+    # etag is stored after the gist, so it never validates an older copy
+    disk_cache.set(key, fetched)
+    disk_cache.set(key + ' etag', response.getheader('ETag'))
+    return fetched
+
+
+def cloned_gist(gist_url, summary=None):
+    """Returns the gist to open from its clone without downloading it, None when it can't be
+
+    The clone is fetched first. Files are described by the listed summary or
+    the gist in the disk cache, which must still have the files of the clone.
+    """
+    settings = sublime.load_settings('Gist.sublime-settings')
+    gist_id = gist_url.rstrip('/').rsplit('/', 1)[-1]
+    if not git_workspace.exists(gist_id):
+        return None
+
+    gist = (
+        summary.to_json()
+        if summary is not None
+        else disk_cache.get(cache_key(gist_url))[0]
+    )
+    if gist is None:
+        return None
+
+    try:
+        git_workspace.sync(
+            gist_id, None, settings.get('token'), settings.get('https_proxy') or None
+        )
+        filenames = git_workspace.files(gist_id)
+    except (
+        GitError,
+        OSError,
+    ):  # e.g. offline, the gist is fetched or read from the cache
+        traceback.print_exc()
+        return None
+
+    files = gist.get('files') or {}
+    if sorted(filenames) != sorted(files) or not all(
+        files[filename].get('type') for filename in filenames
+    ):
+        return None  # changed since it was listed, or listed without media types
+
+    return gist
+
+
+def push_to_clone(gist_url, file_changes, auth_token=None, https_proxy=None):
+    """Pushes new contents of files from the clone of the gist
+
+    Returns False when the gist isn't cloned or the push failed, the update
+    is sent with PATCH then.
+    """
+    settings = sublime.load_settings('Gist.sublime-settings')
+    gist_id = gist_url.rstrip('/').rsplit('/', 1)[-1]
+    if not git_workspace.exists(gist_id):
+        return False
+
+    contents = dict(
+        (gist_filename, change['content'])
+        for gist_filename, change in file_changes.items()
+    )
+    try:
+        git_workspace.commit(
+            gist_id,
+            contents,
+            auth_token or settings.get('token'),
+            https_proxy or settings.get('https_proxy') or None,
+        )
+    except (GitError, OSError):
+        traceback.print_exc()
+        return False
+
+    return True
+
+
+def sync_clone(gist):
+    """Brings the clone of the gist to its latest version, True when the clone has it
+
+    A failed fetch is not an error, the clone can still have the version of
+    a gist from the disk cache, e.g. when offline.
+    """
+    settings = sublime.load_settings('Gist.sublime-settings')
+    try:
+        git_workspace.sync(
+            gist['id'],
+            gist['git_pull_url'],
+            settings.get('token'),
+            settings.get('https_proxy') or None,
+        )
+    except (GitError, OSError):
+        traceback.print_exc()
+
+    history = gist.get('history') or [{}]
+    try:
+        head = git_workspace.head(gist['id'])
+    except (GitError, OSError):
+        return False
+
+    return head is not None and head == history[0].get('version')
+
+
+def invalidate_cache(gist_url=None, deleted=False):
+    """Drops gist lists, and the deleted gist, after a gist was changed here
+
+    Stale lists are shown while they are refreshed, but a list without the
+    gist created here, or with the gist deleted here, must not be shown, so
+    the lists are fetched whole the next time. A changed gist is kept, it is
+    revalidated whenever it is fetched.
+    """
+    settings = sublime.load_settings('Gist.sublime-settings')
+
+    for url_setting in ('GISTS_URL', 'STARRED_GISTS_URL'):
+        disk_cache.delete(cache_key(settings.get(url_setting)))
+
+    if gist_url is not None and deleted:
+        disk_cache.delete(cache_key(gist_url))
+        disk_cache.delete(cache_key(gist_url) + ' etag')
+
+
+def file_content(file_data):
+    """Yields content of a gist file in chunks
+
+    GitHub truncates content of large files, those are streamed from raw_url.
+    """
+    if file_data.get('truncated'):
+        yield from api_request_raw(file_data['raw_url'])
+    else:
+        yield file_data['content']
@@ -0,0 +1,93 @@
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+try:
+    import sublime
+except ImportError:
+    from test.stubs import sublime
+
+
+class UpdateQueue:
+    """Sends saved gist files from one worker, coalescing saves of the same gist
+
+    Saves are delayed, a save arriving in the meantime replaces the content of
+    the file and restarts the delay, all changed files of a gist are sent with
+    one PATCH. Only one PATCH is in flight, so the last save always wins.
+    send(gist_url, changes, token, proxy) is called from the worker.
+    """
+
+    def __init__(self, send, delay=1):
+        self.send = send
+        self.delay = delay
+        self.pending = OrderedDict()  # gist_url -> (due, changes, token, proxy)
+        self.in_flight = None  # (gist_url, changes) being sent
+        self.condition = threading.Condition()
+        self.worker = None
+
+    def put(self, gist_url, file_changes, auth_token=None, https_proxy=None):
+        with self.condition:
+            _, changes, _, _ = self.pending.pop(gist_url, (None, {}, None, None))
+            changes.update(file_changes)
+            due = time.time() + self.delay
+            self.pending[gist_url] = (due, changes, auth_token, https_proxy)
+
+            if self.worker is None:
+                self.worker = threading.Thread(target=self.work, daemon=True)
+                self.worker.start()
+
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """Sends pending updates without waiting for the delay and waits for them"""
+        with self.condition:
+            for gist_url, (_, changes, token, proxy) in list(self.pending.items()):
+                self.pending[gist_url] = (0, changes, token, proxy)
+
+            self.condition.notify_all()
+            return self.condition.wait_for(
+                lambda: not self.pending and self.in_flight is None, timeout
+            )
+
+    def has_pending(self, gist_url, gist_filename):
+        """Whether the file has a change that is not sent yet or is being sent"""
+        with self.condition:
+            updates = [self.pending.get(gist_url, (None, {}))[1]]
+            if self.in_flight is not None and self.in_flight[0] == gist_url:
+                updates.append(self.in_flight[1])
+
+            return any(gist_filename in changes for changes in updates)
+
+    def next_update(self):
+        with self.condition:
+            while True:
+                if not self.pending:
+                    self.condition.wait()
+                    continue
+
+                # put() moves the gist to the end, so the first one is due first
+                gist_url, (due, changes, token, proxy) = next(
+                    iter(self.pending.items())
+                )
+                delay = due - time.time()
+                if delay > 0:
+                    self.condition.wait(delay)
+                    continue
+
+                del self.pending[gist_url]
+                self.in_flight = (gist_url, changes)
+                return gist_url, changes, token, proxy
+
+    def work(self):
+        while True:
+            gist_url, changes, token, proxy = self.next_update()
+            try:
+                self.send(gist_url, changes, token, proxy)
+            except:
+                traceback.print_exc()
+                sublime.status_message("Gist: unable to update the Gist")
+            finally:
+                with self.condition:
+                    self.in_flight = None
+                    self.condition.notify_all()
@@ -0,0 +1,274 @@
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from gist_30_models import GistSummary
+from gist_40_request import parallel_map
+
+
+def words(text):
+    return re.findall(r'[^\W_]+', (text or '').lower())
+
+
+def trigrams(word):
+    padded = ' {} '.format(word)  # short words and word boundaries get trigrams too
+    return set(padded[i : i + 3] for i in range(len(padded) - 2))
+
+
+def gist_words(gist):
+    """Yields words of the description, file names, languages and owner login"""
+    yield from words(gist.description)
+
+    for gist_file in gist.files:
+        yield from words(gist_file.filename)
+        yield from words(gist_file.language)
+
+    yield from words(gist.owner_login)
+
+
+def content_words(chunks):
+    """Returns set of words of text given in chunks, a word may be split between chunks"""
+    found = set()
+    tail = ''
+
+    for chunk in chunks:
+        text = tail + chunk
+        start = re.search(r'[^\W_]*$', text).start()
+        found.update(words(text[:start]))
+        tail = text[start:]
+
+    found.update(words(tail))
+    return found
+
+
+class SearchIndex:
+    """In-memory index for fuzzy search of gists
+
+    Every word of a gist is posted under itself and under its trigrams, so
+    misspelled and partial words of a query match as well.
+    """
+
+    min_similarity = 0.5  # part of trigrams of a query word a gist word must have
+
+    def __init__(self):
+        self.entries = []  # (gist, name) pairs, postings refer to their indexes
+        self.signature = None
+        self.word_postings = {}  # word -> set of entry indexes
+        self.trigram_postings = {}  # trigram -> set of entry indexes
+        self._lock = threading.Lock()
+
+    def update(self, entries):
+        """Indexes (gist, name) pairs, the index is rebuilt only when gists changed"""
+        entries = list(entries)
+        signature = [(gist.id, gist.updated_at, name) for gist, name in entries]
+        if signature == self.signature:
+            return
+
+        unique_entries = []
+        word_postings = {}
+        trigram_postings = {}
+        seen = set()
+
+        for gist, name in entries:
+            if gist.id in seen:  # e.g. own gist that is starred as well
+                continue
+            seen.add(gist.id)
+
+            index = len(unique_entries)
+            unique_entries.append((gist, name))
+
+            for word in set(gist_words(gist)):
+                word_postings.setdefault(word, set()).add(index)
+                for trigram in trigrams(word):
+                    trigram_postings.setdefault(trigram, set()).add(index)
+
+        with self._lock:
+            self.entries = unique_entries
+            self.signature = signature
+            self.word_postings = word_postings
+            self.trigram_postings = trigram_postings
+
+    def search(self, query, limit=100):
+        """Returns (gist, name) pairs matching all words of the query, best first"""
+        with self._lock:
+            entries = self.entries
+            word_postings = self.word_postings
+            trigram_postings = self.trigram_postings
+
+        scores = None
+
+        for word in words(query):
+            word_trigrams = trigrams(word)
+            counts = Counter()
+            for trigram in word_trigrams:
+                counts.update(trigram_postings.get(trigram, ()))
+
+            matches = dict(
+                (index, count / len(word_trigrams))
+                for index, count in counts.items()
+                if count / len(word_trigrams) >= self.min_similarity
+            )
+            for index in word_postings.get(word, ()):  # whole word is the best match
+                matches[index] += 1
+
+            if scores is None:
+                scores = matches
+            else:
+                scores = dict(
+                    (index, scores[index] + score)
+                    for index, score in matches.items()
+                    if index in scores
+                )
+
+        if scores is None:  # empty query
+            return entries[:limit]
+
+        best = heapq.nsmallest(limit, scores, key=lambda index: (-scores[index], index))
+        return [entries[index] for index in best]
+
+
+search_index = SearchIndex()
+
+
+class ContentIndex:
+    """Inverted index of words inside gist files, kept in a JSON file between sessions
+
+    Gists are stored as GistSummary without contents, they are reindexed when
+    their updated_at changes.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.gists = {}  # gist id -> GistSummary.to_json()
+        self.postings = {}  # word -> set of gist ids
+        self.loaded_path = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # the last snapshot taken is written last
+
+    def load(self):
+        """Reads the index from disk once, a missing or broken file gives an empty index"""
+        with self._lock:
+            if self.loaded_path == self.path:
+                return
+
+            self.gists, self.postings = {}, {}
+            self.loaded_path = self.path
+
+            try:
+                with open(self.path, encoding='utf8') as f:
+                    data = json.load(f)
+            except (OSError, TypeError, ValueError):
+                return
+
+            self.gists = data['gists']
+            self.postings = dict(
+                (word, set(gist_ids)) for word, gist_ids in data['postings'].items()
+            )
+
+    def save(self):
+        """Writes a copy of the index, searches are not blocked while it is written"""
+        with self._save_lock:
+            with self._lock:
+                data = {
+                    'gists': dict(self.gists),
+                    'postings': dict(
+                        (word, sorted(gist_ids))
+                        for word, gist_ids in self.postings.items()
+                    ),
+                }
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = '{}.{}.tmp'.format(self.path, threading.get_ident())
+            with open(tmp_path, 'w', encoding='utf8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def outdated(self, gists):
+        """Returns gists that are not indexed or were changed since they were indexed"""
+        with self._lock:
+            return [
+                gist
+                for gist in gists
+                if self.gists.get(gist.id, {}).get('updated_at') != gist.updated_at
+            ]
+
+    def update(self, indexed, removed_ids=()):
+        """Adds (gist, words) pairs, replacing older versions, and drops removed gists"""
+        with self._lock:
+            stale_ids = set(removed_ids) | set(gist.id for gist, _ in indexed)
+            stale_ids &= set(self.gists)
+
+            if stale_ids:  # one pass over all words for the whole batch
+                for word, gist_ids in list(self.postings.items()):
+                    gist_ids -= stale_ids
+                    if not gist_ids:
+                        del self.postings[word]
+
+            for gist_id in removed_ids:
+                self.gists.pop(gist_id, None)
+
+            for gist, found in indexed:
+                self.gists[gist.id] = gist.to_json()
+                for word in found:
+                    self.postings.setdefault(word, set()).add(gist.id)
+
+    def refresh(
+        self, gists, index_gist, on_progress=None, batch_size=100, save_interval=30
+    ):
+        """Reindexes outdated gists and drops gists that are not listed anymore
+
+        index_gist(gist) returns (gist, words) or None to skip the gist, it is
+        called concurrently. The whole index is rewritten at most every
+        save_interval seconds while gists are indexed, and once at the end.
+        """
+        self.load()
+        gists = OrderedDict((gist.id, gist) for gist in gists)
+        outdated = self.outdated(gists.values())
+        saved_at = time.time()
+
+        for start in range(0, len(outdated), batch_size):
+            batch = outdated[start : start + batch_size]
+            self.update([item for item in parallel_map(index_gist, batch) if item])
+            if time.time() - saved_at >= save_interval:
+                self.save()
+                saved_at = time.time()
+            if on_progress is not None:
+                on_progress(start + len(batch), len(outdated))
+
+        with self._lock:
+            removed_ids = [gist_id for gist_id in self.gists if gist_id not in gists]
+
+        if removed_ids:
+            self.update([], removed_ids)
+
+        if outdated or removed_ids:
+            self.save()
+
+    def search(self, query):
+        """Returns summaries of gists having all words of the query, recently updated first
+
+        A word of the query matches indexed words starting with it.
+        """
+        with self._lock:
+            gist_ids = None
+
+            for query_word in words(query):
+                matched = set()
+                for word, word_gist_ids in self.postings.items():
+                    if word.startswith(query_word):
+                        matched |= word_gist_ids
+
+                gist_ids = matched if gist_ids is None else gist_ids & matched
+
+            gists = [
+                GistSummary.from_json(self.gists[gist_id]) for gist_id in gist_ids or ()
+            ]
+
+        return sorted(gists, key=lambda gist: gist.updated_at or '', reverse=True)
+
+
+content_index = ContentIndex()
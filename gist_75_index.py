@@ -0,0 +1,51 @@
+import traceback
+
+try:
+    import sublime
+except ImportError:
+    from test.stubs import sublime
+
+from gist_20_exceptions import RateLimitExceeded, SimpleHTTPError
+from gist_30_models import GistSummary
+from gist_40_request import api_request
+from gist_62_sync import cached_api_request, file_content, run_in_background
+from gist_70_search import content_index, content_words, gist_words
+
+
+def index_contents():
+    """Indexes files of own and starred gists that changed since they were indexed"""
+    settings = sublime.load_settings('Gist.sublime-settings')
+    gists = []
+    for url_setting in ('GISTS_URL', 'STARRED_GISTS_URL'):
+        gists += cached_api_request(
+            settings.get(url_setting), settings.get('max_gists')
+        )
+
+    def on_progress(done, total):
+        sublime.status_message('Gist: indexed {} of {} gists'.format(done, total))
+
+    content_index.refresh(gists, index_gist, on_progress)
+
+
+def index_gist(gist):
+    """Returns (gist, words of its files) or None when the gist can't be fetched"""
+    try:
+        full_gist = api_request(gist.url)
+    except RateLimitExceeded:  # stops the indexing, the rest of gists is skipped
+        raise
+    except SimpleHTTPError:  # e.g. deleted after it was listed
+        traceback.print_exc()
+        return None
+
+    summary = GistSummary.from_json(full_gist)
+    found = set(gist_words(summary))
+    for file_data in full_gist['files'].values():
+        if file_data['type'].split('/')[0] in ('text', 'application'):
+            found |= content_words(file_content(file_data))
+
+    return summary, found
+
+
+def index_contents_in_background():
+    # indexed gists are kept when it fails, the index is still searchable
+    run_in_background('content index', index_contents)
@@ -1,11 +1,12 @@
 import functools
+import hashlib
 import json
 import os
 import shutil
-import tempfile
-import threading
+import time
 import traceback
 import webbrowser
+from collections import OrderedDict
 
 try:
     import sublime
@@ -14,16 +15,56 @@ except ImportError:
     from test.stubs import sublime
     from test.stubs import sublime_plugin
 
-from gist_20_exceptions import MissingCredentialsException
+from gist_20_exceptions import (
+    HostUnavailable,
+    MissingCredentialsException,
+    RateLimitExceeded,
+    RequestCancelled,
+    SimpleHTTPError,
+)
+from gist_30_models import GistSummary
+from gist_35_context import CancelToken, request_cancellation
+from gist_37_responses import response_cache, transfer_counter
+from gist_50_cache import disk_cache, gist_mirror
+from gist_55_git import git_workspace
 from gist_60_helpers import (
+    StatusSpinner,
+    ViewLoader,
+    close_view,
+    content_digest,
     gistify_view,
     gists_filter,
     set_syntax,
     ungistify_view,
 )
-from gist_40_request import api_request
+from gist_62_sync import (
+    cached_api_request,
+    cloned_gist,
+    fetch_gist,
+    file_content,
+    graphql_org_gists,
+    invalidate_cache,
+    push_to_clone,
+    sync_clone,
+)
+from gist_65_updates import UpdateQueue
+from gist_70_search import content_index, search_index
+from gist_75_index import index_contents_in_background
+from gist_40_request import (
+    api_request,
+    configure_transports,
+    graphql_url,
+    parallel_map,
+    rate_limiter,
+    reset_transports,
+    retry_policy,
+)
 
 settings = None
+active_https_proxy = None
+synced_digests = {}  # (gist_url, gist_filename) -> digest of the content on GitHub
+loading_views = {}  # view id -> CancelToken of the download of its gist file
+UNLOAD_TIMEOUT = 10  # seconds plugin_unloaded waits for queued saves
 
 
 def plugin_loaded():
@@ -33,21 +74,60 @@ def plugin_loaded():
     set_settings()
 
 
-def set_settings():
-    if settings.get('max_gists') > 100:
-        settings.set('max_gists', 100)  # the URLs are not updated.
-        sublime.status_message(
-            "Gist: GitHub API does not support a value of higher than 100"
-        )
+def plugin_unloaded():
+    """Sends delayed saves and writes mirrored files, their daemon workers die on exit"""
+    if not update_queue.flush(UNLOAD_TIMEOUT):
+        print('Gist: saved files were not sent in {} seconds'.format(UNLOAD_TIMEOUT))
+    gist_mirror.flush(UNLOAD_TIMEOUT)
+
 
-    url_args = '?per_page=%d' % settings.get('max_gists')
+def set_settings():
+    # GitHub API returns up to 100 items per page, the rest is fetched page by page
+    url_args = '?per_page=%d' % min(settings.get('max_gists'), 100)
 
     api_url = settings.get('api_url')  # Should add validation?
     settings.set('GISTS_URL', api_url + '/gists' + url_args)
     settings.set('USER_GISTS_URL', api_url + '/users/%s/gists' + url_args)
     settings.set('STARRED_GISTS_URL', api_url + '/gists/starred' + url_args)
-    settings.set('ORGS_URL', api_url + '/user/orgs')
-    settings.set('ORG_MEMBERS_URL', api_url + '/orgs/%s/members')
+    settings.set('ORGS_URL', api_url + '/user/orgs?per_page=100')
+    settings.set('ORG_MEMBERS_URL', api_url + '/orgs/%s/members?per_page=100')
+    settings.set('GRAPHQL_URL', graphql_url(api_url))
+
+    configure_transports(
+        settings.get('connection_pool_size', 4),
+        settings.get('connection_idle_timeout', 60),
+        settings.get('connect_timeout', 10),
+        settings.get('read_timeout', 30),
+    )
+
+    response_cache.configure(
+        settings.get('http_cache_entries', 200),
+        settings.get('http_cache_bytes', 16 * 1024 * 1024),
+    )
+
+    disk_cache.configure(
+        os.path.join(sublime.cache_path(), 'Gist'),
+        settings.get('cache_ttl', 300),
+        settings.get('cache_size', 32 * 1024 * 1024),
+    )
+
+    gist_mirror.directory = os.path.join(sublime.cache_path(), 'Gist Mirror')
+    git_workspace.directory = os.path.join(sublime.cache_path(), 'Gist Clones')
+    git_workspace.git = settings.get('git_path') or 'git'
+    content_index.path = os.path.join(
+        sublime.cache_path(), 'Gist Index', 'contents.json'
+    )
+    update_queue.delay = settings.get('update_on_save_delay', 1)
+    rate_limiter.reserve = settings.get('rate_limit_reserve', 100)
+    retry_policy.attempts = settings.get('retry_attempts', 3)
+    retry_policy.deadline = settings.get('retry_deadline', 30)
+    rate_limiter.on_update = on_rate_limit_update
+
+    global active_https_proxy
+    https_proxy = settings.get('https_proxy') or None
+    if https_proxy != active_https_proxy:
+        active_https_proxy = https_proxy
+        reset_transports()  # connections of the old proxy must not be reused
 
 
 def catch_errors(fn):
@@ -70,6 +150,22 @@ def catch_errors(fn):
                 shutil.copy(default_settings_path, user_settings_path)
             sublime.active_window().open_file(user_settings_path)
             return None
+        except RateLimitExceeded as e:
+            sublime.error_message(
+                "Gist: GitHub API rate limit exceeded, it is reset at {}".format(
+                    time.strftime('%H:%M', time.localtime(e.reset))
+                    if e.reset
+                    else 'the top of the hour'
+                )
+            )
+            return None
+        except HostUnavailable as e:
+            sublime.error_message(
+                "Gist: {} is not responding, try again later".format(e.host)
+            )
+            return None
+        except RequestCancelled:
+            return None
         except:
             traceback.print_exc()
             sublime.error_message("Gist: unknown error (please, report a bug!)")
@@ -78,6 +174,28 @@ def catch_errors(fn):
     return _fn
 
 
+def rate_limit_status():
+    remaining, limit, _ = rate_limiter.latest
+
+    if remaining is None:
+        return None
+
+    return 'GitHub API: {}/{}'.format(remaining, limit)
+
+
+def show_rate_limit(view):
+    status = rate_limit_status()
+
+    if view is not None and status is not None:
+        view.set_status('Gist Rate Limit', status)
+
+
+def on_rate_limit_update(remaining, limit, reset):
+    sublime.set_timeout(
+        lambda: show_rate_limit(sublime.active_window().active_view()), 0
+    )
+
+
 def create_gist(public, description, files):
     for _, text in list(files.items()):
         if not text:
@@ -91,28 +209,79 @@ def create_gist(public, description, files):
         {'description': description, 'public': public, 'files': file_data}
     )
     gist = api_request(settings.get('GISTS_URL'), data)
+    invalidate_cache()
     return gist
 
 
 def update_gist(
     gist_url, file_changes, auth_token=None, https_proxy=None, new_description=None
 ):
+    """Returns the updated gist, None when the changes were pushed from its clone"""
     request = {'files': file_changes}
     if new_description is not None:
         request['description'] = new_description
     data = json.dumps(request)
-    result = api_request(
-        gist_url, data, token=auth_token, https_proxy=https_proxy, method="PATCH"
+    # setting the same contents again gives the same gist, renames and deletes don't
+    idempotent = all(
+        change is not None and list(change) == ['content']
+        for change in file_changes.values()
+    )
+    pushed = (
+        settings.get('use_git')
+        and idempotent
+        and new_description is None
+        and push_to_clone(gist_url, file_changes, auth_token, https_proxy)
     )
+    result = None  # git push gives no gist, nobody waits for it after a save
+    if not pushed:
+        result = api_request(
+            gist_url,
+            data,
+            token=auth_token,
+            https_proxy=https_proxy,
+            method="PATCH",
+            idempotent=idempotent,
+        )
+    invalidate_cache(gist_url)
+
+    for gist_filename, change in file_changes.items():
+        synced_digests.pop((gist_url, gist_filename), None)
+        if change is not None and 'content' in change:
+            new_filename = change.get('filename', gist_filename)
+            synced_digests[gist_url, new_filename] = content_digest(change['content'])
 
     sublime.status_message("Gist updated")
 
     return result
 
 
-def open_gist(gist_url):
-    gist = api_request(gist_url)
+def send_update(gist_url, changes, token, https_proxy):
+    # update_gist is looked up when the update is sent, tests replace it
+    update_gist(gist_url, changes, token, https_proxy)
+
+
+update_queue = UpdateQueue(send_update)
+
+
+def is_synced(gist_url, gist_filename, text):
+    """Whether the text is already on GitHub and no other change of the file is queued"""
+    digest = synced_digests.get((gist_url, gist_filename))
+
+    if digest is None or digest != content_digest(text):
+        return False
+
+    return not update_queue.has_pending(gist_url, gist_filename)
+
+
+def open_gist(gist_url, summary=None):
+    # a cloned gist is opened with a git fetch, without downloading its files
+    gist = settings.get('use_git') and cloned_gist(gist_url, summary)
+    from_clone = bool(gist)
+    if not gist:
+        gist = fetch_gist(gist_url)
+        from_clone = bool(settings.get('use_git')) and sync_clone(gist)
     files = sorted(gist['files'].keys())
+    views = []
 
     for gist_filename in files:
         allowed_types = ['text', 'application']
@@ -122,34 +291,84 @@ def open_gist(gist_url):
 
         view = sublime.active_window().new_file()
 
-        gistify_view(view, gist, gist_filename)
-
-        view.run_command(
-            'append',
-            {
-                'characters': gist['files'][gist_filename]['content'],
-            },
-        )
+        gistify_view(view, GistSummary.from_json(gist), gist_filename)
 
         if settings.get('supress_save_dialog'):
             view.set_scratch(True)
 
-        if settings.get('update_on_save'):
-            view.retarget(
-                os.path.join(
-                    tempfile.gettempdir(), "{}-{}".format(gist['id'], gist_filename)
-                )
-            )
-            # Save over it (to stop us reloading from that file in case it exists)
-            # But don't actually do a gist update
-            view.settings().set('do-update', False)
-            view.run_command('save')
-
         set_syntax(view, gist['files'][gist_filename])
 
+        views.append((view, gist_filename))
+
+    started = set()  # ids of views whose files started loading
+
+    def load(item):
+        view, gist_filename = item
+        started.add(view.id())
+        load_gist_file(view, gist, gist_filename, from_clone)
+
+    # views are opened in the order of files, but filled as the files are downloaded
+    try:
+        parallel_map(load, views)
+    except:
+        # loads dropped after a failed one would leave empty views of the gist,
+        # saving one of them would empty the file on GitHub
+        for view, _ in views:
+            if view.id() not in started:
+                close_view(view)
+        raise
+
+
+def load_gist_file(view, gist, gist_filename, from_clone=False):
+    loader = ViewLoader(view, gist_filename, gist['files'][gist_filename].get('size'))
+    # same as content_digest of the whole text, which is never kept in memory
+    digest = hashlib.sha1()
+    cancelled = loading_views[view.id()] = CancelToken()
+    try:
+        if from_clone:
+            chunks = git_workspace.read(gist['id'], gist_filename)
+        else:
+            chunks = file_content(gist['files'][gist_filename])
+        with request_cancellation(cancelled):
+            for chunk in chunks:
+                loader.write(chunk)
+                digest.update(chunk.encode('utf8'))
+    except RequestCancelled:  # the view was closed
+        return
+    except:
+        ungistify_view(view)  # partial text must not be saved over the gist file
+        loader.close()  # keep what is loaded editable
+        raise
+    finally:
+        loading_views.pop(view.id(), None)
+    synced_digests[gist['url'], gist_filename] = digest.hexdigest()
+
+    if settings.get('update_on_save'):
+        loader.close(functools.partial(mirror_gist_file, view, gist, gist_filename))
+    else:
+        loader.close()
+
+
+def mirror_gist_file(view, gist, gist_filename):
+    """Points the view to its copy in the gist mirror, the copy is written in background"""
+    path = gist_mirror.path(gist['id'], gist_filename)
+    view.retarget(path)
+    change_count = view.change_count()
+
+    def on_written():
+        # reverting to the written copy marks the view as not modified,
+        # unless it was edited in the meantime
+        def revert():
+            if view.change_count() == change_count:
+                view.run_command('revert')
+
+        sublime.set_timeout(revert, 0)
+
+    gist_mirror.write(path, view.substr(sublime.Region(0, view.size())), on_written)
+
 
 def insert_gist(gist_url):
-    gist = api_request(gist_url)
+    gist = fetch_gist(gist_url)
     files = sorted(gist['files'].keys())
 
     for gist_filename in files:
@@ -159,24 +378,16 @@ def insert_gist(gist_url):
 
         if is_auto_indent:
             view.settings().set('auto_indent', False)
-            view.run_command(
-                'insert',
-                {
-                    'characters': gist['files'][gist_filename]['content'],
-                },
-            )
+
+        for chunk in file_content(gist['files'][gist_filename]):
+            view.run_command('insert', {'characters': chunk})
+
+        if is_auto_indent:
             view.settings().set('auto_indent', True)
-        else:
-            view.run_command(
-                'insert',
-                {
-                    'characters': gist['files'][gist_filename]['content'],
-                },
-            )
 
 
 def insert_gist_embed(gist_url):
-    gist = api_request(gist_url)
+    gist = fetch_gist(gist_url)
     files = sorted(gist['files'].keys())
 
     for gist_filename in files:
@@ -260,7 +471,11 @@ class GistCommand(sublime_plugin.TextCommand):
                 sublime.status_message("%s Gist: %s" % (self.mode(), gist_html_url))
 
                 if gistify:
-                    gistify_view(self.view, gist, list(gist['files'].keys())[0])
+                    gistify_view(
+                        self.view,
+                        GistSummary.from_json(gist),
+                        list(gist['files'].keys())[0],
+                    )
 
             window.show_input_panel(
                 'Gist File Name: (optional):', filename, on_gist_filename, None, None
@@ -310,7 +525,7 @@ class GistRenameFileCommand(GistViewCommand, sublime_plugin.TextCommand):
                 text = self.view.substr(sublime.Region(0, self.view.size()))
                 file_changes = {old_filename: {'filename': filename, 'content': text}}
                 new_gist = update_gist(self.gist_url(), file_changes)
-                gistify_view(self.view, new_gist, filename)
+                gistify_view(self.view, GistSummary.from_json(new_gist), filename)
                 sublime.status_message('Gist file renamed')
 
         self.view.window().show_input_panel(
@@ -324,7 +539,9 @@ class GistChangeDescriptionCommand(GistViewCommand, sublime_plugin.TextCommand):
         def on_gist_description(description):
             if description and description != self.gist_description():
                 gist_url = self.gist_url()
-                new_gist = update_gist(gist_url, {}, new_description=description)
+                new_gist = GistSummary.from_json(
+                    update_gist(gist_url, {}, new_description=description)
+                )
                 for window in sublime.windows():
                     for view in window.views():
                         if view.settings().get('gist_url') == gist_url:
@@ -346,6 +563,11 @@ class GistUpdateFileCommand(GistViewCommand, sublime_plugin.TextCommand):
     @catch_errors
     def run(self, edit):
         text = self.view.substr(sublime.Region(0, self.view.size()))
+
+        if is_synced(self.gist_url(), self.gist_filename(), text):
+            sublime.status_message("Gist is up to date")
+            return
+
         changes = {self.gist_filename(): {'content': text}}
         update_gist(self.gist_url(), changes)
         sublime.status_message("Gist updated")
@@ -365,6 +587,7 @@ class GistDeleteCommand(GistViewCommand, sublime_plugin.TextCommand):
     def run(self, edit):
         gist_url = self.gist_url()
         api_request(gist_url, method='DELETE')
+        invalidate_cache(gist_url, deleted=True)
         for window in sublime.windows():
             for view in window.views():
                 if view.settings().get("gist_url") == gist_url:
@@ -382,78 +605,163 @@ class GistListCommandBase:
     """Base command to show list of gists and handle selected gist"""
 
     gists = orgs = users = []
+    lists = None  # list name -> (gists, name prefix), in the order they are shown
+    panel_shown = False
+    cancelled = None  # set to stop the requests when the command runs again
+    debounce_delay = 0.5  # seconds, repeated invocations within it are ignored
+    last_run = 0
 
-    @catch_errors
     def run(
         self, *args
     ):  # TextCommand sends sublime.Edit object and WindowCommand is not
-        filtered_gists, filtered_gist_names = gists_filter(
-            api_request(settings.get('STARRED_GISTS_URL')), '★ '
-        )
+        now = time.time()
+        if now - self.last_run < self.debounce_delay:
+            return
+        self.last_run = now
 
-        if not settings.get('use_starred'):
-            # add not starred gists
-            filtered_not_stared = gists_filter(api_request(settings.get('GISTS_URL')))
-            filtered_gists = filtered_not_stared[0] + filtered_gists
-            filtered_gist_names = filtered_not_stared[1] + filtered_gist_names
+        self.load_in_background(self.load_gists)
 
-        self.gists = filtered_gists
-        gist_names = filtered_gist_names
+    def load_in_background(self, load):
+        """Runs load off the UI thread with a spinner, shows the panel when it's done"""
+        self.cancel()
+        cancelled = self.cancelled = CancelToken()
+        spinner = StatusSpinner('Gist: loading')
+        spinner.start()
+
+        @catch_errors
+        def work():
+            try:
+                with request_cancellation(cancelled):
+                    load()
+            finally:
+                spinner.stop()
 
-        if settings.get('include_users'):
-            self.users = list(settings.get('include_users'))
-            gist_names = [["> " + user] for user in self.users] + gist_names
+            if not cancelled.is_set():
+                sublime.set_timeout(self.show_panel, 0)
 
-        if settings.get('include_orgs'):
+        sublime.set_timeout_async(work, 0)
+
+    def load_gists(self):
+        self.lists = OrderedDict()  # keys are added first to keep the order of lists
+        if not settings.get('use_starred'):
+            self.lists['gists'] = ([], '')  # add not starred gists
+        self.lists['starred'] = ([], '★ ')
+
+        def load_orgs():
             if settings.get('include_orgs') is True:
                 self.orgs = [
-                    org.get("login") for org in api_request(settings.get('ORGS_URL'))
+                    org.get("login")
+                    for org in cached_api_request(settings.get('ORGS_URL'))
                 ]
             else:
-                self.orgs = settings.get('include_orgs')
+                self.orgs = list(settings.get('include_orgs') or [])
+
+        loaders = [
+            lambda: self.load_list('starred', settings.get('STARRED_GISTS_URL'), '★ '),
+            load_orgs,
+        ]
+        if 'gists' in self.lists:
+            loaders.append(lambda: self.load_list('gists', settings.get('GISTS_URL')))
+
+        # the lists don't depend on each other, so they are fetched concurrently
+        parallel_map(lambda load: load(), loaders, self.cancelled)
+        self.users = list(settings.get('include_users') or [])
+
+    def load_org_gists(self, org):
+        gists = None
+
+        if settings.get('use_graphql'):
+            try:
+                gists = graphql_org_gists(org, settings.get('max_gists'))
+            except SimpleHTTPError:  # e.g. GitHub Enterprise without GraphQL API
+                traceback.print_exc()
+
+        if gists is None:
+            gists = self.rest_org_gists(org)
+
+        self.lists = OrderedDict([('org', (gists, ''))])
+        self.orgs = self.users = []
+
+    def rest_org_gists(self, org):
+        members = [
+            member.get("login")
+            for member in cached_api_request(settings.get('ORG_MEMBERS_URL') % org)
+        ]
+
+        def member_gists(member):
+            return cached_api_request(
+                settings.get('USER_GISTS_URL') % member, settings.get('max_gists')
+            )
 
-            gist_names = [["> " + org] for org in self.orgs] + gist_names
+        # members are fetched concurrently, but merged in the order of members
+        gists = []
+        for gists_of_member in parallel_map(member_gists, members, self.cancelled):
+            gists += gists_of_member
 
-        def on_gist_num(num):
-            """Handles gist when user selected it from the list"""
-            off_orgs = len(self.orgs)
-            off_users = off_orgs + len(self.users)
+        return gists
 
-            if num < 0:
-                pass
-            elif num < off_orgs:
-                self.gists = []
+    def load_user_gists(self, user):
+        self.lists = OrderedDict()
+        self.load_list('user', settings.get('USER_GISTS_URL') % user)
+        self.orgs = self.users = []
 
-                members = [
-                    member.get("login")
-                    for member in api_request(
-                        settings.get('ORG_MEMBERS_URL') % self.orgs[num]
-                    )
-                ]
-                for member in members:
-                    self.gists += api_request(settings.get('USER_GISTS_URL') % member)
-
-                filtered = gists_filter(self.gists)
-                self.gists = filtered[0]
-                gist_names = filtered[1]
-
-                self.orgs = self.users = []
-                self.get_window().show_quick_panel(gist_names, on_gist_num)
-            elif num < off_users:
-                filtered = gists_filter(
-                    api_request(
-                        settings.get('USER_GISTS_URL') % self.users[num - off_orgs]
-                    )
-                )
-                self.gists = filtered[0]
-                gist_names = filtered[1]
+    def load_list(self, name, url, name_prefix=''):
+        """Adds gists to the panel, the panel is updated when the rest of pages is loaded"""
+        lists = self.lists
 
-                self.orgs = self.users = []
-                self.get_window().show_quick_panel(gist_names, on_gist_num)
-            else:
-                self.handle_gist(self.gists[num - off_users])
+        def on_update(gists):
+            lists[name] = (gists, name_prefix)
+            if self.lists is lists:
+                self.lists_updated()
+
+        gists = cached_api_request(url, settings.get('max_gists'), on_update)
+        lists[name] = (gists, name_prefix)
+
+    def lists_updated(self):
+        """Called on the UI thread when the rest of pages of a list was loaded"""
+        if self.panel_shown:
+            self.show_panel()
+
+    def show_panel(self):
+        self.gists = []
+        gist_names = []
 
-        self.get_window().show_quick_panel(gist_names, on_gist_num)
+        for gists, name_prefix in self.lists.values():
+            filtered_gists, filtered_gist_names = gists_filter(gists, name_prefix)
+            self.gists += filtered_gists
+            gist_names += filtered_gist_names
+
+        gist_names = (
+            [["> " + org] for org in self.orgs]
+            + [["> " + user] for user in self.users]
+            + gist_names
+        )
+
+        self.panel_shown = True
+        self.get_window().show_quick_panel(gist_names, self.on_gist_num)
+
+    def on_gist_num(self, num):
+        """Handles gist when user selected it from the list"""
+        self.panel_shown = False
+        off_orgs = len(self.orgs)
+        off_users = off_orgs + len(self.users)
+
+        if num < 0:
+            self.cancel()
+        elif num < off_orgs:
+            org = self.orgs[num]
+            self.load_in_background(lambda: self.load_org_gists(org))
+        elif num < off_users:
+            user = self.users[num - off_orgs]
+            self.load_in_background(lambda: self.load_user_gists(user))
+        else:
+            gist = self.gists[num - off_users]
+            sublime.set_timeout_async(lambda: self.handle_gist(gist), 0)
+
+    def cancel(self):
+        """Stops requests started for the panel"""
+        if self.cancelled is not None:
+            self.cancelled.set()
 
     def handle_gist(self, gist):
         raise NotImplementedError()
@@ -467,36 +775,139 @@ class GistListCommand(GistListCommandBase, sublime_plugin.WindowCommand):
 
     @catch_errors
     def handle_gist(self, gist):
-        open_gist(gist['url'])
+        open_gist(gist.url, gist)
 
     def get_window(self):
         return self.window
 
 
+class GistSearchCommand(GistListCommandBase, sublime_plugin.WindowCommand):
+    """Searches listed gists by description, file names, languages and owner"""
+
+    max_results = 100
+
+    def load_gists(self):
+        super().load_gists()
+        self.index_gists()
+        self.orgs = self.users = []
+
+    def index_gists(self):
+        entries = []
+        for gists, name_prefix in self.lists.values():
+            filtered_gists, gist_names = gists_filter(gists, name_prefix)
+            entries += zip(filtered_gists, gist_names)
+
+        search_index.update(entries)
+
+    def show_panel(self):
+        self.get_window().show_input_panel(
+            'Search Gists:', '', self.on_query, None, self.cancel
+        )
+
+    def lists_updated(self):
+        # rebuilding the index of thousands of gists takes seconds
+        sublime.set_timeout_async(self.index_gists, 0)
+
+    def on_query(self, query):
+        results = search_index.search(query, self.max_results)
+
+        if not results:
+            sublime.status_message('Gist: nothing found')
+            return
+
+        self.gists = [gist for gist, _ in results]
+        self.get_window().show_quick_panel(
+            [name for _, name in results], self.on_gist_num
+        )
+
+    @catch_errors
+    def handle_gist(self, gist):
+        open_gist(gist.url, gist)
+
+    def get_window(self):
+        return self.window
+
+
+class GistSearchContentsCommand(sublime_plugin.WindowCommand):
+    """Searches words inside the files of own and starred gists"""
+
+    gists = []
+
+    def run(self):
+        index_contents_in_background()  # the previous index is searched meanwhile
+        self.window.show_input_panel(
+            'Search Gist Contents:', '', self.on_query, None, None
+        )
+
+    def on_query(self, query):
+        # the index is read and searched off the UI thread, indexing may hold it
+        sublime.set_timeout_async(lambda: self.search(query), 0)
+
+    @catch_errors
+    def search(self, query):
+        content_index.load()
+        gists, gist_names = gists_filter(content_index.search(query))
+
+        if not gists:
+            sublime.status_message('Gist: nothing found')
+            return
+
+        def show():
+            self.gists = gists
+            self.window.show_quick_panel(gist_names, self.on_gist_num)
+
+        sublime.set_timeout(show, 0)
+
+    def on_gist_num(self, num):
+        if num >= 0:
+            gist = self.gists[num]
+            sublime.set_timeout_async(
+                lambda: catch_errors(open_gist)(gist.url, gist), 0
+            )
+
+
+class GistTransferStatsCommand(sublime_plugin.WindowCommand):
+    """Shows how much compression of responses saved since Sublime Text was started"""
+
+    def run(self):
+        received, decoded = transfer_counter.received, transfer_counter.decoded
+        saved = 100 - received * 100 // decoded if decoded else 0
+
+        sublime.status_message(
+            'Gist: received {} KB for {} KB of responses, {}% saved'.format(
+                received // 1024, decoded // 1024, saved
+            )
+        )
+
+
 class GistListener(GistViewCommand, sublime_plugin.EventListener):
     """Updates the gist during file save without showing filename dialog"""
 
+    def on_activated(self, view):  # pylint: disable=no-self-use
+        show_rate_limit(view)
+
+    def on_close(self, view):  # pylint: disable=no-self-use
+        cancelled = loading_views.get(view.id())
+        if cancelled is not None:
+            cancelled.set()  # nobody waits for the rest of the file
+
     @catch_errors
     def on_pre_save(self, view):  # pylint: disable=no-self-use
         if view.settings().get('gist_filename') is not None:
             if settings.get('update_on_save'):
-                # we ignore the first update, it happens upon loading a gist
-                if not view.settings().get('do-update'):
-                    view.settings().set('do-update', True)
-                    return
                 text = view.substr(sublime.Region(0, view.size()))
-                changes = {view.settings().get('gist_filename'): {'content': text}}
+                gist_filename = view.settings().get('gist_filename')
                 gist_url = view.settings().get('gist_url')
-                # Start update_gist in a thread so we don't stall the save
-                threading.Thread(
-                    target=update_gist,
-                    args=(
-                        gist_url,
-                        changes,
-                        settings.get('token'),
-                        settings.get('https_proxy'),
-                    ),
-                ).start()
+                if is_synced(gist_url, gist_filename, text):
+                    return  # nothing changed since the gist was opened or updated
+                changes = {gist_filename: {'content': text}}
+                # Queue the update so we don't stall the save
+                update_queue.put(
+                    gist_url,
+                    changes,
+                    settings.get('token'),
+                    settings.get('https_proxy'),
+                )
 
 
 class InsertGistListCommand(GistListCommandBase, sublime_plugin.WindowCommand):
@@ -504,7 +915,7 @@ class InsertGistListCommand(GistListCommandBase, sublime_plugin.WindowCommand):
 
     @catch_errors
     def handle_gist(self, gist):
-        insert_gist(gist['url'])
+        insert_gist(gist.url)
 
     def get_window(self):
         return self.window
@@ -515,7 +926,7 @@ class InsertGistEmbedListCommand(GistListCommandBase, sublime_plugin.WindowComma
 
     @catch_errors
     def handle_gist(self, gist):
-        insert_gist_embed(gist['url'])
+        insert_gist_embed(gist.url)
 
     def get_window(self):
         return self.window
@@ -534,8 +945,8 @@ class GistAddFileCommand(GistListCommandBase, sublime_plugin.TextCommand):
             if filename:
                 text = self.view.substr(sublime.Region(0, self.view.size()))
                 changes = {filename: {'content': text}}
-                new_gist = update_gist(gist['url'], changes)
-                gistify_view(self.view, new_gist, filename)
+                update_gist(gist.url, changes)
+                gistify_view(self.view, gist, filename)
                 sublime.status_message("File added to Gist")
 
         filename = os.path.basename(
@@ -63,3 +63,12 @@ GIST_WITH_RAW_URL = {
         'some_file2.txt': {'raw_url': 'some another raw url', 'content': 'another content'}
     }
 }
+
+GIST_WITH_TRUNCATED_FILE = {
+    'id': 'gist8',
+    'url': 'some truncated gist url',
+    'files': {
+        'some_log.txt': {'type': 'text/plain', 'raw_url': 'some raw url', 'content': 'some',
+                         'truncated': True},
+    }
+}
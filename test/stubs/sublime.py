@@ -1,10 +1,15 @@
+import atexit
 import json
 import re
+import shutil
+import tempfile
 from os import path
 from unittest.mock import Mock
 
 settings_storage = {}
 _windows = {}
+_cache_path = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, _cache_path, True)
 
 json_comments_regex = re.compile(r'^\s*//.*', re.MULTILINE)
 
@@ -14,10 +19,25 @@ error_message = Mock()
 set_clipboard = Mock()
 
 
+def set_timeout(callback, delay=0):
+    # only immediate callbacks are run, timers never fire in tests
+    if not delay:
+        callback()
+
+
+def set_timeout_async(callback, delay=0):
+    if not delay:
+        callback()
+
+
 def packages_path():
     return ''
 
 
+def cache_path():
+    return _cache_path
+
+
 def active_window():
     if 0 not in _windows:
         _windows[0] = Window(0)
@@ -98,9 +118,13 @@ class View:
         self._file_name = None
         self._status = {}
         self._run_command = Mock()
+        self._read_only = False
         self.selection = Mock()
         self.selection.return_value = []
 
+    def id(self):
+        return id(self)
+
     def settings(self):
         return self._settings
 
@@ -110,6 +134,9 @@ class View:
     def size(self):
         return 0
 
+    def change_count(self):
+        return 0
+
     def file_name(self):
         return self._file_name
 
@@ -138,6 +165,12 @@ class View:
         """
         return scratch
 
+    def set_read_only(self, read_only):
+        self._read_only = read_only
+
+    def is_read_only(self):
+        return self._read_only
+
     def retarget(self, new_fname):
         pass
 
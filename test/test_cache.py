@@ -0,0 +1,94 @@
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from gist_50_cache import DiskCache, GistMirror
+
+
+class TestDiskCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = DiskCache(os.path.join(self.directory.name, 'Gist'), ttl=60, max_bytes=1024)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    @patch('gist_50_cache.time.time')
+    def test_get_set(self, mocked_time):
+        self.assertEqual(self.cache.get('some key'), (None, False))
+
+        mocked_time.return_value = 100
+        self.cache.set('some key', [{'id': 'gist1'}])
+        self.assertEqual(self.cache.get('some key'), ([{'id': 'gist1'}], True))
+
+        mocked_time.return_value = 161
+        self.assertEqual(self.cache.get('some key'), ([{'id': 'gist1'}], False))
+
+        # survives a new cache instance (plugin reload)
+        another_cache = DiskCache(self.cache.directory, ttl=60)
+        self.assertEqual(another_cache.get('some key'), ([{'id': 'gist1'}], False))
+
+    def test_invalidate(self):
+        self.cache.invalidate('some key')
+        self.assertEqual(self.cache.get('some key'), (None, False))
+
+        self.cache.set('some key', {'id': 'gist1'})
+        self.cache.invalidate('some key')
+        self.assertEqual(self.cache.get('some key'), ({'id': 'gist1'}, False))
+
+    def test_delete(self):
+        self.cache.delete('some key')
+        self.cache.set('some key', {'id': 'gist1'})
+        self.cache.delete('some key')
+        self.assertEqual(self.cache.get('some key'), (None, False))
+
+    def test_size_cap(self):
+        self.cache.set('old key', 'x' * 500)
+        os.utime(self.cache.path('old key'), (0, 0))
+        self.cache.set('new key', 'y' * 600)
+
+        self.assertEqual(self.cache.get('old key'), (None, False))
+        self.assertEqual(self.cache.get('new key'), ('y' * 600, True))
+
+        self.cache.clear()
+        self.assertEqual(self.cache.get('new key'), (None, False))
+
+    def test_disabled(self):
+        cache = DiskCache()
+        cache.set('some key', 'some value')
+        self.assertEqual(cache.get('some key'), (None, False))
+
+        self.cache.configure(self.cache.directory, 60, 0)
+        self.cache.set('some key', 'some value')
+        self.assertEqual(self.cache.get('some key'), (None, False))
+
+
+class TestGistMirror(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.mirror = GistMirror(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write(self):
+        path = self.mirror.path('some_id', 'some_file.txt')
+        self.assertEqual(path, os.path.join(self.directory.name, 'some_id', 'some_file.txt'))
+
+        on_written = Mock()
+        self.mirror.write(path, 'first\r\nline', on_written)
+        self.assertTrue(self.mirror.flush(timeout=5))
+        on_written.assert_called_once_with()
+
+        with open(path, encoding='utf8', newline='') as f:
+            self.assertEqual(f.read(), 'first\r\nline')
+
+        # a failed write doesn't stop the writer
+        with patch('gist_50_cache.traceback.print_exc'):
+            self.mirror.write(os.path.join(path, 'not a directory'), 'text')
+            self.mirror.write(path, 'second')
+            self.assertTrue(self.mirror.flush(timeout=5))
+
+        with open(path, encoding='utf8') as f:
+            self.assertEqual(f.read(), 'second')
@@ -1,21 +1,32 @@
 from threading import Lock
 from unittest import TestCase
-from unittest.mock import Mock, patch
+from unittest.mock import ANY, Mock, patch
 
 import gist_80 as gist
+from gist_30_models import GistSummary
 from test.stubs import github_api, sublime
 
 DEFAULT_GISTS_URL = 'https://api.github.com/gists?per_page=100'
 DEFAULT_STARRED_GISTS_URL = 'https://api.github.com/gists/starred?per_page=100'
-DEFAULT_ORGS_URL = 'https://api.github.com/user/orgs'
+DEFAULT_ORGS_URL = 'https://api.github.com/user/orgs?per_page=100'
 
 TEST_GIST_URL = 'https://api.github.test/gists/45681ac0a18a46b487620c6836e1510c'
+TEST_GIST = GistSummary('45681ac0a18a46b487620c6836e1510c', url=TEST_GIST_URL)
 
-TEST_ORG_MEMBERS_URL = 'https://api.github.com/orgs/0/members'
+TEST_ORG_MEMBERS_URL = 'https://api.github.com/orgs/0/members?per_page=100'
 TEST_ORG_GIST_URL = 'https://api.github.com/users/some_organization/gists?per_page=100'
 TEST_MEMBERS_URL = 'https://api.github.com/users/0/gists?per_page=100'
 
 
+def pages_by_url(lists):
+    """api_request_pages side effect returning the list for the URL as one page"""
+    return lambda url, max_items=None: iter([lists[url]])
+
+
+def requested_urls(mocked_api_request_pages):
+    return [mock_call[1] for mock_call in mocked_api_request_pages.mock_calls]
+
+
 class TestGistCommand(TestCase):
     def test_gist_copy_url(self,):
         gist_copy_url = gist.GistCopyUrl()
@@ -28,10 +39,20 @@ class TestGistCommand(TestCase):
         gist_open_browser.run(edit=None)
         patch_gist_webbrowser.open.assert_called_with(None)
 
-    @patch('gist_80.api_request')
-    def test_gist_list_command_base(self, mocked_api_request):
+    @patch('gist_80.GistListCommandBase.debounce_delay', 0)
+    @patch('gist_62_sync.disk_cache')
+    @patch('gist_62_sync.api_request_pages')
+    def test_gist_list_command_base(self, mocked_api_request_pages, mocked_disk_cache):
         gist.plugin_loaded()
-        mocked_api_request.side_effect = [github_api.GIST_STARRED_LIST, github_api.GIST_LIST]
+        mocked_disk_cache.get.return_value = (None, False)
+        mocked_api_request_pages.side_effect = pages_by_url({
+            DEFAULT_STARRED_GISTS_URL: github_api.GIST_STARRED_LIST,
+            DEFAULT_GISTS_URL: github_api.GIST_LIST,
+            DEFAULT_ORGS_URL: [{'login': 'some org login'}],
+            TEST_ORG_MEMBERS_URL: [{'login': 'some_organization'}],
+            TEST_ORG_GIST_URL: github_api.GIST_LIST,
+            TEST_MEMBERS_URL: github_api.GIST_LIST,
+        })
         gist.settings.set('include_users', ['some user'])
         gist.settings.set('include_orgs', ['some org'])
         gist_list_base = gist.GistListCommandBase()
@@ -40,25 +61,23 @@ class TestGistCommand(TestCase):
             mocked_window = Mock()
             mocked_get_window.return_value = mocked_window
             gist_list_base.run()
-            self.assertEqual(mocked_api_request.call_count, 2)
-            self.assertEqual(mocked_api_request.mock_calls[0][1], (DEFAULT_STARRED_GISTS_URL,))
-            self.assertEqual(mocked_api_request.mock_calls[1][1], (DEFAULT_GISTS_URL,))
+            # the lists are fetched concurrently
+            self.assertCountEqual(requested_urls(mocked_api_request_pages),
+                                  [(DEFAULT_STARRED_GISTS_URL, 100), (DEFAULT_GISTS_URL, 100)])
             self.assertEqual(mocked_window.show_quick_panel.call_args[0][0],
                              [['> some org'], ['> some user'], ['some shell gist'], ['some python gist'],
                               ['★ some starred gist']])
 
             # test include_orgs is True
-            mocked_api_request.reset_mock()
-            mocked_api_request.side_effect = [github_api.GIST_STARRED_LIST, github_api.GIST_LIST,
-                                              [{'login': 'some org login'}]]
+            mocked_api_request_pages.reset_mock()
             gist.settings.set('include_orgs', True)
             gist_list_base.run()
-            self.assertEqual(mocked_api_request.call_count, 3)
-            self.assertEqual(mocked_api_request.mock_calls[2][1], (DEFAULT_ORGS_URL,))
+            self.assertCountEqual(requested_urls(mocked_api_request_pages),
+                                  [(DEFAULT_STARRED_GISTS_URL, 100), (DEFAULT_GISTS_URL, 100), (DEFAULT_ORGS_URL, None)])
+            self.assertEqual(mocked_window.show_quick_panel.call_args[0][0][0], ['> some org login'])
 
             # test run() accepts one argument
-            mocked_api_request.reset_mock()
-            mocked_api_request.side_effect = [github_api.GIST_STARRED_LIST, github_api.GIST_LIST]
+            mocked_api_request_pages.reset_mock()
             gist.settings.set('include_users', [])
             gist.settings.set('include_orgs', [])
             gist_list_base = gist.GistListCommandBase()
@@ -70,65 +89,205 @@ class TestGistCommand(TestCase):
 
             # pass flow
             mocked_window.reset_mock()
-            mocked_api_request.reset_mock()
+            mocked_api_request_pages.reset_mock()
             with patch('gist_80.GistListCommandBase.handle_gist') as mocked_handle_gist:
                 on_gist_num(-1)
 
-                self.assertEqual(mocked_api_request.call_count, 0)
+                self.assertEqual(mocked_api_request_pages.call_count, 0)
                 self.assertEqual(mocked_window.show_quick_panel.call_count, 0)
                 self.assertEqual(mocked_handle_gist.call_count, 0)
 
             # personal gists flow
             mocked_window.reset_mock()
-            mocked_api_request.reset_mock()
+            mocked_api_request_pages.reset_mock()
             with patch('gist_80.GistListCommandBase.handle_gist') as mocked_handle_gist:
                 on_gist_num(0)
 
-                self.assertEqual(mocked_api_request.call_count, 0)
+                self.assertEqual(mocked_api_request_pages.call_count, 0)
                 self.assertEqual(mocked_window.show_quick_panel.call_count, 0)
-                mocked_handle_gist.assert_called_with(github_api.GIST_LIST[0])
+                self.assertEqual(mocked_handle_gist.call_args[0][0].id, github_api.GIST_LIST[0]['id'])
 
             # organizations flow
             mocked_window.reset_mock()
-            mocked_api_request.reset_mock()
-            mocked_api_request.side_effect = [[{'login': 'some_organization'}], github_api.GIST_LIST]
+            mocked_api_request_pages.reset_mock()
             gist_list_base.orgs = [0]  # off_orgs = 1
 
             on_gist_num(0)
 
-            self.assertEqual(mocked_api_request.call_count, 2)
-            self.assertEqual(mocked_api_request.call_args_list[0][0][0], TEST_ORG_MEMBERS_URL)
-            self.assertEqual(mocked_api_request.call_args_list[1][0][0], TEST_ORG_GIST_URL)
+            self.assertEqual(mocked_api_request_pages.call_count, 2)
+            self.assertEqual(mocked_api_request_pages.call_args_list[0][0][0], TEST_ORG_MEMBERS_URL)
+            self.assertEqual(mocked_api_request_pages.call_args_list[1][0][0], TEST_ORG_GIST_URL)
             mocked_window.show_quick_panel.assert_called_with([['some shell gist'], ['some python gist']], on_gist_num)
 
             # users flow
             mocked_window.reset_mock()
-            mocked_api_request.reset_mock()
-            mocked_api_request.side_effect = [github_api.GIST_LIST]
+            mocked_api_request_pages.reset_mock()
             gist_list_base.users = [0]  # off_users = 1
 
             on_gist_num(0)
 
-            self.assertEqual(mocked_api_request.call_count, 1)
-            self.assertEqual(mocked_api_request.call_args_list[0][0][0], TEST_MEMBERS_URL)
+            self.assertEqual(mocked_api_request_pages.call_count, 1)
+            self.assertEqual(mocked_api_request_pages.call_args_list[0][0][0], TEST_MEMBERS_URL)
             mocked_window.show_quick_panel.assert_called_with([['some shell gist'], ['some python gist']], on_gist_num)
 
         self.assertRaises(NotImplementedError, gist_list_base.handle_gist, None)
         self.assertRaises(NotImplementedError, gist_list_base.get_window)
 
+    @patch('gist_80.GistListCommandBase.get_window')
+    @patch('gist_80.GistListCommandBase.load_gists')
+    def test_gist_list_command_base_async(self, mocked_load_gists, mocked_get_window):
+        gist.plugin_loaded()
+        gist_list_base = gist.GistListCommandBase()
+        gist_list_base.lists = {}
+
+        with patch('gist_80.sublime.set_timeout_async') as mocked_set_timeout_async:
+            gist_list_base.run()
+            self.assertEqual(mocked_load_gists.call_count, 0)  # nothing is loaded on the UI thread
+
+            # repeated invocation is debounced
+            gist_list_base.run()
+            self.assertEqual(mocked_set_timeout_async.call_count, 1)
+
+            work = mocked_set_timeout_async.call_args[0][0]
+
+        with patch('gist_80.StatusSpinner.stop') as mocked_spinner_stop:
+            work()
+            self.assertEqual(mocked_load_gists.call_count, 1)
+            self.assertEqual(mocked_spinner_stop.call_count, 1)
+            mocked_get_window().show_quick_panel.assert_called_with([], gist_list_base.on_gist_num)
+
+        # cancelled load does not show the panel
+        mocked_get_window.reset_mock()
+        with patch('gist_80.sublime.set_timeout_async') as mocked_set_timeout_async:
+            gist_list_base.load_in_background(lambda: None)
+            work = mocked_set_timeout_async.call_args[0][0]
+        gist_list_base.on_gist_num(-1)
+        work()
+        self.assertEqual(mocked_get_window().show_quick_panel.call_count, 0)
+
+        # errors are reported and stop the spinner
+        mocked_load_gists.side_effect = gist.RequestCancelled()
+        with patch('gist_80.StatusSpinner.stop') as mocked_spinner_stop:
+            gist_list_base.load_in_background(mocked_load_gists)
+            self.assertEqual(mocked_spinner_stop.call_count, 1)
+        self.assertEqual(mocked_get_window().show_quick_panel.call_count, 0)
+
+    def test_status_spinner(self):
+        spinner = gist.StatusSpinner('Gist: loading')
+
+        with patch('gist_60_helpers.sublime.set_timeout') as mocked_set_timeout:
+            spinner.start()
+            sublime.status_message.assert_called_with('Gist: loading |')
+
+            mocked_set_timeout.call_args[0][0]()
+            sublime.status_message.assert_called_with('Gist: loading /')
+
+            spinner.stop()
+            sublime.status_message.reset_mock()
+            mocked_set_timeout.call_args[0][0]()
+            self.assertEqual(sublime.status_message.call_count, 0)
+
     @patch('gist_80.open_gist')
     def test_gist_list_command(self, mocked_open_gist):
         mocked_window = Mock()
         gist_list = gist.GistListCommand(mocked_window)
-        gist_list.handle_gist({'url': TEST_GIST_URL})
-        mocked_open_gist.assert_called_with(TEST_GIST_URL)
+        gist_list.handle_gist(TEST_GIST)
+        mocked_open_gist.assert_called_with(TEST_GIST_URL, TEST_GIST)
         self.assertEqual(gist_list.get_window(), mocked_window)
 
+    @patch('gist_80.GistListCommandBase.debounce_delay', 0)
+    @patch('gist_80.open_gist')
+    @patch('gist_62_sync.disk_cache')
+    @patch('gist_62_sync.api_request_pages')
+    def test_gist_search_command(self, mocked_api_request_pages, mocked_disk_cache, mocked_open_gist):
+        gist.plugin_loaded()
+        gist.settings.set('include_users', ['some user'])
+        gist.settings.set('include_orgs', [])
+        mocked_disk_cache.get.return_value = (None, False)
+        mocked_api_request_pages.side_effect = pages_by_url({
+            DEFAULT_STARRED_GISTS_URL: github_api.GIST_STARRED_LIST,
+            DEFAULT_GISTS_URL: github_api.GIST_LIST,
+        })
+        mocked_window = Mock()
+        gist_search = gist.GistSearchCommand(mocked_window)
+
+        gist_search.run()
+        self.assertEqual(mocked_window.show_input_panel.call_args[0][0], 'Search Gists:')
+        on_query = mocked_window.show_input_panel.call_args[0][2]
+
+        on_query('pyton')
+        # users and organizations are not listed with the results
+        self.assertEqual(mocked_window.show_quick_panel.call_args[0][0], [['some python gist']])
+        self.assertEqual([gist_summary.id for gist_summary in gist_search.gists], [github_api.GIST_LIST[1]['id']])
+        gist_search.handle_gist(TEST_GIST)
+        mocked_open_gist.assert_called_with(TEST_GIST_URL, TEST_GIST)
+
+        mocked_window.show_quick_panel.reset_mock()
+        on_query('some_test.sh')
+        self.assertEqual(mocked_window.show_quick_panel.call_args[0][0],
+                         [['some shell gist'], ['★ some starred gist']])
+
+        mocked_window.show_quick_panel.reset_mock()
+        on_query('nothing like this')
+        self.assertEqual(mocked_window.show_quick_panel.call_count, 0)
+        sublime.status_message.assert_called_with('Gist: nothing found')
+        gist.settings.set('include_users', [])
+
+    @patch('gist_80.search_index')
+    @patch('gist_80.cached_api_request')
+    def test_gist_search_indexes_off_the_ui_thread(self, mocked_cached_api_request, mocked_search_index):
+        gist.plugin_loaded()
+        first_page = [GistSummary.from_json(github_api.GIST_LIST[0])]
+        mocked_cached_api_request.return_value = first_page
+        mocked_search_index.search.return_value = []
+        gist_search = gist.GistSearchCommand(Mock())
+        gist_search.lists = {}
+        gist_search.load_list('gists', DEFAULT_GISTS_URL)
+        on_update = mocked_cached_api_request.call_args[0][2]
+
+        # queries only search, the index is never rebuilt on the UI thread
+        gist_search.on_query('some query')
+        self.assertFalse(mocked_search_index.update.called)
+
+        # the rest of pages is indexed in background
+        all_gists = first_page + [GistSummary.from_json(github_api.GIST_LIST[1])]
+        with patch('gist_80.sublime.set_timeout_async') as mocked_set_timeout_async:
+            on_update(all_gists)
+        self.assertFalse(mocked_search_index.update.called)
+        mocked_set_timeout_async.call_args[0][0]()
+        self.assertEqual([indexed.id for indexed, _ in mocked_search_index.update.call_args[0][0]],
+                         [gist_summary.id for gist_summary in all_gists])
+
+    @patch('gist_80.open_gist')
+    @patch('gist_80.index_contents_in_background')
+    @patch('gist_80.content_index')
+    def test_gist_search_contents_command(self, mocked_content_index, mocked_index_contents, mocked_open_gist):
+        gist.plugin_loaded()
+        mocked_content_index.search.return_value = [GistSummary.from_json(dict(github_api.GIST_LIST[0], url=TEST_GIST_URL))]
+        mocked_window = Mock()
+        search_contents = gist.GistSearchContentsCommand(mocked_window)
+
+        search_contents.run()
+        mocked_index_contents.assert_called_with()
+        on_query = mocked_window.show_input_panel.call_args[0][2]
+
+        on_query('some words')
+        mocked_content_index.search.assert_called_with('some words')
+        self.assertEqual(mocked_window.show_quick_panel.call_args[0][0], [['some shell gist']])
+        mocked_window.show_quick_panel.call_args[0][1](0)
+        mocked_open_gist.assert_called_with(TEST_GIST_URL, mocked_content_index.search.return_value[0])
+
+        mocked_window.show_quick_panel.reset_mock()
+        mocked_content_index.search.return_value = []
+        on_query('nothing like this')
+        self.assertEqual(mocked_window.show_quick_panel.call_count, 0)
+        sublime.status_message.assert_called_with('Gist: nothing found')
+
     @patch('gist_80.insert_gist')
     def test_insert_gist_list_command(self, mocked_insert_gist):
         mocked_window = Mock()
         insert_gist_list = gist.InsertGistListCommand(mocked_window)
-        insert_gist_list.handle_gist({'url': TEST_GIST_URL})
+        insert_gist_list.handle_gist(TEST_GIST)
         mocked_insert_gist.assert_called_with(TEST_GIST_URL)
         self.assertEqual(insert_gist_list.get_window(), mocked_window)
 
@@ -136,7 +295,7 @@ class TestGistCommand(TestCase):
     def test_insert_gist_embed_list_command(self, mocked_insert_gist_embed):
         mocked_window = Mock()
         insert_gist_embed_list = gist.InsertGistEmbedListCommand(mocked_window)
-        insert_gist_embed_list.handle_gist({'url': TEST_GIST_URL})
+        insert_gist_embed_list.handle_gist(TEST_GIST)
         mocked_insert_gist_embed.assert_called_with(TEST_GIST_URL)
         self.assertEqual(insert_gist_embed_list.get_window(), mocked_window)
 
@@ -144,7 +303,7 @@ class TestGistCommand(TestCase):
     @patch('gist_80.update_gist')
     def test_gist_add_file_command(self, mocked_update_gist, mocked_gistify_view):
         add_file = gist.GistAddFileCommand()
-        add_file.handle_gist({'url': TEST_GIST_URL})
+        add_file.handle_gist(TEST_GIST)
         self.assertEqual(add_file.view.window().show_input_panel.call_args[0][0], 'File Name:')
         self.assertEqual(add_file.view.window().show_input_panel.call_args[0][1], '')
         self.assertEqual(add_file.view.window().show_input_panel.call_args[0][3], None)
@@ -155,13 +314,87 @@ class TestGistCommand(TestCase):
         add_file.view.settings().set('gist_url', 'not none')
         self.assertFalse(add_file.is_enabled())
 
-        mocked_update_gist.return_value = 'some new gist'
         on_filename = add_file.view.window().show_input_panel.call_args[0][2]
         on_filename('some file')
         mocked_update_gist.assert_called_with(TEST_GIST_URL, {'some file': {'content': ''}})
-        mocked_gistify_view.assert_called_with(add_file.view, 'some new gist', 'some file')
+        mocked_gistify_view.assert_called_with(add_file.view, TEST_GIST, 'some file')
         sublime.status_message.assert_called_with('File added to Gist')
 
+    @patch('gist_80.gistify_view')
+    @patch('gist_80.fetch_gist')
+    @patch('gist_62_sync.git_workspace')
+    def test_gist_add_file_command_with_git(self, mocked_workspace, mocked_fetch_gist, mocked_gistify_view):
+        gist.plugin_loaded()
+        sublime.settings_storage['Gist.sublime-settings'].set('use_git', True)
+        self.addCleanup(sublime.settings_storage['Gist.sublime-settings'].set, 'use_git', False)
+        mocked_workspace.exists.return_value = True
+
+        add_file = gist.GistAddFileCommand()
+        add_file.handle_gist(TEST_GIST)
+        on_filename = add_file.view.window().show_input_panel.call_args[0][2]
+        on_filename('some file')
+
+        # the file is pushed, the view gets the listed gist, which is not downloaded again
+        mocked_workspace.commit.assert_called_with(TEST_GIST.id, {'some file': ''}, ANY, None)
+        self.assertFalse(mocked_fetch_gist.called)
+        mocked_gistify_view.assert_called_with(add_file.view, TEST_GIST, 'some file')
+        sublime.status_message.assert_called_with('File added to Gist')
+
+    @patch('gist_80.traceback.print_exc')
+    @patch('gist_62_sync.disk_cache')
+    @patch('gist_62_sync.api_request_pages')
+    @patch('gist_62_sync.api_graphql')
+    def test_load_org_gists_with_graphql(self, mocked_api_graphql, mocked_api_request_pages, mocked_disk_cache,
+                                         mocked_print_exc):
+        gist.plugin_loaded()
+        gist.settings.set('use_graphql', True)
+        self.addCleanup(gist.settings.set, 'use_graphql', False)
+        mocked_disk_cache.get.return_value = (None, False)
+
+        def member(*names):
+            return {'gists': {'nodes': [{'name': name, 'description': name, 'files': [{'name': name + '.txt'}]}
+                                        for name in names]}}
+
+        mocked_api_graphql.side_effect = [
+            {'organization': {'membersWithRole': {'pageInfo': {'hasNextPage': True, 'endCursor': 'cursor'},
+                                                  'nodes': [member('gist1', 'gist2'), member()]}}},
+            {'organization': {'membersWithRole': {'pageInfo': {'hasNextPage': False, 'endCursor': None},
+                                                  'nodes': [member('gist3')]}}},
+        ]
+        gist_list_base = gist.GistListCommandBase()
+
+        gist_list_base.load_org_gists('some org')
+
+        gists, _ = gist_list_base.lists['org']
+        self.assertEqual([gist_summary.id for gist_summary in gists], ['gist1', 'gist2', 'gist3'])
+        self.assertEqual(gists[0].url, 'https://api.github.com/gists/gist1')
+        self.assertEqual(mocked_api_graphql.call_args_list[0][0][0], 'https://api.github.com/graphql')
+        self.assertEqual(mocked_api_graphql.call_args_list[0][0][2], {'org': 'some org', 'after': None, 'gists': 100})
+        self.assertEqual(mocked_api_graphql.call_args_list[1][0][2]['after'], 'cursor')
+        self.assertEqual(mocked_api_request_pages.call_count, 0)
+
+        # REST API is the fallback
+        mocked_api_graphql.side_effect = gist.SimpleHTTPError('GraphQL: not supported')
+        mocked_api_request_pages.side_effect = pages_by_url({
+            TEST_ORG_MEMBERS_URL: [{'login': 'some_organization'}],
+            TEST_ORG_GIST_URL: github_api.GIST_LIST,
+        })
+
+        gist_list_base.load_org_gists(0)
+
+        gists, _ = gist_list_base.lists['org']
+        self.assertEqual([gist_summary.id for gist_summary in gists], ['gist1', 'gist2'])
+        self.assertEqual(mocked_print_exc.call_count, 1)
+
+    @patch('gist_80.transfer_counter')
+    def test_gist_transfer_stats_command(self, mocked_transfer_counter):
+        mocked_transfer_counter.received = 10 * 1024
+        mocked_transfer_counter.decoded = 100 * 1024
+
+        gist.GistTransferStatsCommand(sublime.Window(0)).run()
+
+        sublime.status_message.assert_called_with('Gist: received 10 KB for 100 KB of responses, 90% saved')
+
     def test_gist_view_command(self):
         gist_view_command = gist.GistViewCommand()
         gist_view_command.view = sublime.View()
@@ -187,7 +420,7 @@ class TestGistCommand(TestCase):
         gist_command.view = sublime.View()
         window = gist_command.view._window
 
-        mocked_create_gist.return_value = {'html_url': 'some html url', 'files': {'test.txt': None}}
+        mocked_create_gist.return_value = {'html_url': 'some html url', 'files': {'test.txt': {}}}
 
         self.assertEqual(gist_command.mode(), 'Public')
 
@@ -238,7 +471,7 @@ class TestGistCommand(TestCase):
     @patch('gist_80.update_gist')
     def test_gist_rename_file_command(self, mocked_update_gist, mocked_gistify_view):
         gist_rename_file = gist.GistRenameFileCommand()
-        mocked_update_gist.return_value = 'some updated gist'
+        mocked_update_gist.return_value = {'id': 'some updated gist'}
 
         gist_rename_file.run(edit=False)
 
@@ -251,14 +484,16 @@ class TestGistCommand(TestCase):
 
         on_filename('some new filename')
         mocked_update_gist.assert_called_with(None, {None: {'filename': 'some new filename', 'content': ''}})
-        mocked_gistify_view.assert_called_with(gist_rename_file.view, 'some updated gist', 'some new filename')
+        self.assertEqual(mocked_gistify_view.call_args[0][0], gist_rename_file.view)
+        self.assertEqual(mocked_gistify_view.call_args[0][1].id, 'some updated gist')
+        self.assertEqual(mocked_gistify_view.call_args[0][2], 'some new filename')
         sublime.status_message.assert_called_with('Gist file renamed')
 
     @patch('gist_80.gistify_view')
     @patch('gist_80.update_gist')
     def test_change_description_command(self, mocked_update_gist, mocked_gistify_view):
         sublime._windows[0] = sublime.Window(0)
-        mocked_update_gist.return_value = 'some updated gist'
+        mocked_update_gist.return_value = {'id': 'some updated gist'}
         change_description = gist.GistChangeDescriptionCommand()
         change_description.run(edit=False)
 
@@ -271,7 +506,9 @@ class TestGistCommand(TestCase):
         on_gist_description('some description')
 
         mocked_update_gist.assert_called_with(None, {}, new_description='some description')
-        mocked_gistify_view.assert_called_with(sublime._windows[0]._view, 'some updated gist', None)
+        self.assertEqual(mocked_gistify_view.call_args[0][0], sublime._windows[0]._view)
+        self.assertEqual(mocked_gistify_view.call_args[0][1].id, 'some updated gist')
+        self.assertEqual(mocked_gistify_view.call_args[0][2], None)
         sublime.status_message.assert_called_with('Gist description changed')
 
     @patch('gist_80.update_gist')
@@ -297,6 +534,7 @@ class TestGistCommand(TestCase):
     @patch('gist_80.ungistify_view')
     @patch('gist_80.api_request')
     def test_gist_delete_command(self, mocked_api_request, mocked_ungistify_view):
+        gist.plugin_loaded()
         gist_delete = gist.GistDeleteCommand()
         gist_delete.run(edit=False)
 
@@ -327,18 +565,31 @@ class TestGistCommand(TestCase):
         gist_listener.on_pre_save(view)
         gist.settings.set('update_on_save', False)
         self.assertEqual(self.update_gist_call_count, 0)
-        self.assertIsNone(view.settings().get('do-update'))
 
         view.settings().set('gist_filename', 'test_gist.txt')
         gist_listener.on_pre_save(view)
+        self.assertTrue(gist.update_queue.flush(timeout=5))
         self.assertEqual(self.update_gist_call_count, 0)
-        self.assertIsNone(view.settings().get('do-update'))
 
         gist.settings.set('update_on_save', True)
         gist_listener.on_pre_save(view)
-        self.assertEqual(self.update_gist_call_count, 0)
-        self.assertTrue(view.settings().get('do-update'))
+        self.assertTrue(gist.update_queue.flush(timeout=5))
+        self.assertEqual(self.update_gist_call_count, 1)
 
-        gist_listener.on_pre_save(view)
+        # unchanged content is not sent again
+        with patch('gist_80.is_synced', return_value=True):
+            gist_listener.on_pre_save(view)
+        self.assertTrue(gist.update_queue.flush(timeout=5))
         self.assertEqual(self.update_gist_call_count, 1)
-        self.assertTrue(view.settings().get('do-update'))
+
+    @patch('gist_80.gist_mirror')
+    @patch('gist_80.update_gist')
+    def test_delayed_saves_are_sent_on_unload(self, mocked_update_gist, mocked_gist_mirror):
+        gist.update_queue.delay = 60
+        gist.update_queue.put('some gist url', {'file1.txt': {'content': 'saved before exit'}})
+
+        gist.plugin_unloaded()
+        mocked_update_gist.assert_called_once_with('some gist url', {'file1.txt': {'content': 'saved before exit'}},
+                                                   None, None)
+        mocked_gist_mirror.flush.assert_called_once_with(gist.UNLOAD_TIMEOUT)
+        gist.update_queue.delay = 1
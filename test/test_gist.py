@@ -1,18 +1,21 @@
 import json
-from io import StringIO
+import threading
 from unittest import TestCase
-from unittest.mock import Mock, patch
-from urllib.error import HTTPError
+from unittest.mock import ANY, Mock, patch
 
 import gist_40_request as gist_request
 import gist_60_helpers as gist_helpers
 import gist_80 as gist
-from gist_20_exceptions import MissingCredentialsException, SimpleHTTPError
+from gist_30_models import GistFile, GistSummary
+from gist_20_exceptions import GitError, MissingCredentialsException, SimpleHTTPError
 from test.stubs import sublime
 from test.stubs import github_api
 
 
 class TestGist(TestCase):
+    def setUp(self):
+        gist.disk_cache.clear()
+
     @patch('gist_80.api_request')
     def test_create_gist(self, mocked_api_request):
         gist.plugin_loaded()
@@ -47,8 +50,9 @@ class TestGist(TestCase):
 
     @patch('gist_80.api_request')
     def test_update_gist(self, mocked_api_request):
+        gist.plugin_loaded()
         gist_url = 'some gist url'
-        file_changes = 'some file changes'
+        file_changes = {'some_file.txt': {'content': 'some content'}}
         auth_token = 'some auth token'
         https_proxy = 'some https proxy'
         new_description = 'some new description'
@@ -61,43 +65,197 @@ class TestGist(TestCase):
 
         gist.update_gist(gist_url, file_changes, auth_token, https_proxy, new_description)
         mocked_api_request.assert_called_with(gist_url, api_request_data, token=auth_token, https_proxy=https_proxy,
-                                              method=http_method)
+                                              method=http_method, idempotent=True)
         sublime.status_message.assert_called_with('Gist updated')
 
+        # renamed or deleted file is gone after the first attempt, so it isn't retried
+        gist.update_gist(gist_url, {'some_file.txt': {'filename': 'new_file.txt'}})
+        self.assertFalse(mocked_api_request.call_args[1]['idempotent'])
+        gist.update_gist(gist_url, {'some_file.txt': None})
+        self.assertFalse(mocked_api_request.call_args[1]['idempotent'])
+
+    @patch('gist_80.api_request')
+    def test_skip_synced_content(self, mocked_api_request):
+        gist.plugin_loaded()
+        gist_url = 'some synced gist url'
+
+        self.assertFalse(gist.is_synced(gist_url, 'some_file.txt', 'some content'))
+
+        gist.update_gist(gist_url, {'some_file.txt': {'content': 'some content'}})
+        self.assertTrue(gist.is_synced(gist_url, 'some_file.txt', 'some content'))
+        self.assertFalse(gist.is_synced(gist_url, 'some_file.txt', 'changed content'))
+
+        # queued change of the file must be overridden even by the synced content
+        with patch('gist_80.update_queue.has_pending', return_value=True):
+            self.assertFalse(gist.is_synced(gist_url, 'some_file.txt', 'some content'))
+
+        # renamed file
+        gist.update_gist(gist_url, {'some_file.txt': {'filename': 'new_file.txt', 'content': 'some content'}})
+        self.assertFalse(gist.is_synced(gist_url, 'some_file.txt', 'some content'))
+        self.assertTrue(gist.is_synced(gist_url, 'new_file.txt', 'some content'))
+
+        # deleted file
+        gist.update_gist(gist_url, {'new_file.txt': None})
+        self.assertFalse(gist.is_synced(gist_url, 'new_file.txt', 'some content'))
+
+        # opened gist, truncated files are synced with the content downloaded from raw_url
+        with patch('gist_80.fetch_gist', return_value={'id': 'gist', 'url': gist_url, 'files': {
+            'opened.txt': {'type': 'text/plain', 'content': 'opened content'},
+            'truncated.txt': {'type': 'text/plain', 'content': 'partial', 'truncated': True,
+                              'raw_url': 'some raw url'},
+        }}), patch('gist_62_sync.api_request_raw', return_value=iter(['partial', ' and the rest'])), \
+                patch('gist_80.gistify_view'), patch('gist_80.set_syntax'):
+            gist.open_gist(gist_url)
+        self.assertTrue(gist.is_synced(gist_url, 'opened.txt', 'opened content'))
+        self.assertFalse(gist.is_synced(gist_url, 'truncated.txt', 'partial'))
+        self.assertTrue(gist.is_synced(gist_url, 'truncated.txt', 'partial and the rest'))
+
+        # update file command skips the request
+        mocked_api_request.reset_mock()
+        update_file = gist.GistUpdateFileCommand()
+        update_file.view.settings().set('gist_url', gist_url)
+        update_file.view.settings().set('gist_filename', 'opened.txt')
+        with patch.object(update_file.view, 'substr', return_value='opened content'):
+            update_file.run(edit=None)
+        self.assertEqual(mocked_api_request.call_count, 0)
+        sublime.status_message.assert_called_with('Gist is up to date')
+
+    @patch('gist_62_sync.traceback.print_exc')
+    @patch('gist_80.api_request')
+    @patch('gist_62_sync.git_workspace')
+    @patch('gist_80.fetch_gist')
+    def test_update_gist_with_git(self, mocked_fetch_gist, mocked_workspace, mocked_api_request, _):
+        gist.plugin_loaded()
+        sublime.settings_storage['Gist.sublime-settings'].set('use_git', True)
+        self.addCleanup(sublime.settings_storage['Gist.sublime-settings'].set, 'use_git', False)
+        gist_url = 'https://api.github.com/gists/some_id'
+        mocked_workspace.exists.return_value = True
+
+        # pushed gist is not sent with PATCH nor downloaded again
+        result = gist.update_gist(gist_url, {'some_file.txt': {'content': 'some content'}}, 'some token')
+        mocked_workspace.commit.assert_called_with('some_id', {'some_file.txt': 'some content'}, 'some token', None)
+        self.assertFalse(mocked_fetch_gist.called)
+        self.assertFalse(mocked_api_request.called)
+        self.assertIsNone(result)
+
+        # failed push is sent with PATCH
+        mocked_workspace.commit.side_effect = GitError('push rejected')
+        gist.update_gist(gist_url, {'some_file.txt': {'content': 'some content'}})
+        self.assertEqual(mocked_api_request.call_args[1]['method'], 'PATCH')
+
+        # renames are never pushed
+        mocked_workspace.commit.reset_mock()
+        gist.update_gist(gist_url, {'some_file.txt': {'filename': 'new_file.txt'}})
+        self.assertFalse(mocked_workspace.commit.called)
+        self.assertEqual(mocked_api_request.call_count, 2)
+
+    @patch('gist_80.gist_mirror.write')
+    @patch('gist_62_sync.traceback.print_exc')
+    @patch('gist_80.set_syntax')
+    @patch('gist_80.gistify_view')
+    @patch('gist_62_sync.api_request_raw')
+    @patch('gist_62_sync.git_workspace')
+    @patch('gist_80.fetch_gist')
+    def test_open_gist_from_clone(self, mocked_fetch_gist, mocked_workspace, mocked_api_request_raw, *_):
+        gist.plugin_loaded()
+        sublime.settings_storage['Gist.sublime-settings'].set('use_git', True)
+        self.addCleanup(sublime.settings_storage['Gist.sublime-settings'].set, 'use_git', False)
+        mocked_fetch_gist.return_value = {
+            'id': 'gist', 'url': 'some gist url', 'git_pull_url': 'some pull url',
+            'history': [{'version': 'v2'}],
+            'files': {'file.txt': {'type': 'text/plain', 'raw_url': 'some raw url', 'truncated': True}},
+        }
+        mocked_workspace.read.return_value = iter(['from clone'])
+        mocked_api_request_raw.return_value = iter(['from raw url'])
+        # the clone is synced with the gist and read by the views
+        patch('gist_80.git_workspace', mocked_workspace).start()
+        self.addCleanup(patch.stopall)
+
+        # fetch failed and the clone has an older version
+        mocked_workspace.sync.side_effect = GitError('could not resolve host')
+        mocked_workspace.head.return_value = 'v1'
+        view = Mock()
+        with patch('test.stubs.sublime.Window.new_file', return_value=view):
+            gist.open_gist('some gist url')
+        view.run_command.assert_any_call('append', {'characters': 'from raw url', 'force': True})
+
+        mocked_workspace.head.return_value = 'v2'
+        view = Mock()
+        with patch('test.stubs.sublime.Window.new_file', return_value=view):
+            gist.open_gist('some gist url')
+        mocked_workspace.read.assert_called_with('gist', 'file.txt')
+        view.run_command.assert_any_call('append', {'characters': 'from clone', 'force': True})
+
+    @patch('gist_80.gist_mirror.write')
+    @patch('gist_80.set_syntax')
+    @patch('gist_80.gistify_view')
+    @patch('gist_80.git_workspace')
+    @patch('gist_80.fetch_gist')
+    def test_open_listed_gist_from_clone(self, mocked_fetch_gist, mocked_workspace, mocked_gistify_view, *_):
+        gist.plugin_loaded()
+        sublime.settings_storage['Gist.sublime-settings'].set('use_git', True)
+        self.addCleanup(sublime.settings_storage['Gist.sublime-settings'].set, 'use_git', False)
+        summary = GistSummary('gist', url='https://api.github.test/gists/gist',
+                              files=(GistFile('file.txt', 'text/plain'),))
+        mocked_workspace.files.return_value = ['file.txt']
+        mocked_workspace.read.return_value = iter(['from clone'])
+
+        # listed gist is opened with a git fetch, its files are not downloaded
+        view = Mock()
+        with patch('gist_62_sync.git_workspace', mocked_workspace), \
+                patch('test.stubs.sublime.Window.new_file', return_value=view):
+            gist.open_gist(summary.url, summary)
+        mocked_workspace.sync.assert_called_with('gist', None, ANY, None)
+        self.assertFalse(mocked_fetch_gist.called)
+        self.assertEqual(mocked_gistify_view.call_args[0][1].id, 'gist')
+        view.run_command.assert_any_call('append', {'characters': 'from clone', 'force': True})
+
+        # a file added elsewhere is not listed yet, the gist is fetched
+        mocked_workspace.files.return_value = ['file.txt', 'new file.txt']
+        mocked_fetch_gist.return_value = {
+            'id': 'gist', 'url': summary.url, 'git_pull_url': 'some pull url', 'history': [{'version': 'v1'}],
+            'files': {'file.txt': {'type': 'text/plain', 'content': ''}},
+        }
+        with patch('gist_62_sync.git_workspace', mocked_workspace), \
+                patch('test.stubs.sublime.Window.new_file', return_value=Mock()):
+            gist.open_gist(summary.url, summary)
+        mocked_fetch_gist.assert_called_with(summary.url)
+
+    @patch('gist_80.gist_mirror.write')
     @patch('gist_80.set_syntax')
     @patch('gist_80.gistify_view')
     @patch('test.stubs.sublime.Window.new_file')
-    @patch('gist_80.api_request')
-    def test_open_gist(self, mocked_api_request, mocked_new_file, mocked_gistify_view, mocked_set_syntax):
+    @patch('gist_80.fetch_gist')
+    def test_open_gist(self, mocked_fetch_gist, mocked_new_file, mocked_gistify_view, mocked_set_syntax,
+                       mocked_gist_mirror_write):
+        gist.plugin_loaded()
         gist_url = 'some gist url'
-        mocked_api_request.return_value = github_api.GIST_WITH_FILE_CONTENT_AND_TYPE
+        mocked_fetch_gist.return_value = github_api.GIST_WITH_FILE_CONTENT_AND_TYPE
         view = Mock()
         mocked_new_file.return_value = view
 
         gist.open_gist(gist_url)
-        mocked_api_request.assert_called_with(gist_url)
+        mocked_fetch_gist.assert_called_with(gist_url)
         self.assertEqual(mocked_new_file.call_count, 2)
 
         self.assertEqual(mocked_gistify_view.call_count, 2)
         self.assertEqual(mocked_gistify_view.call_args_list[0][0][0], view)
-        self.assertEqual(mocked_gistify_view.call_args_list[0][0][1], github_api.GIST_WITH_FILE_CONTENT_AND_TYPE)
+        self.assertEqual(mocked_gistify_view.call_args_list[0][0][1].id, github_api.GIST_WITH_FILE_CONTENT_AND_TYPE['id'])
         self.assertEqual(mocked_gistify_view.call_args_list[0][0][2], 'some_file1.txt')
 
-        self.assertEqual(view.run_command.call_count, 4)
-        self.assertEqual(len(view.run_command.call_args_list[0][0]), 2)
-        self.assertEqual(view.run_command.call_args_list[0][0][0], 'append')
-        self.assertEqual(view.run_command.call_args_list[0][0][1], {'characters': 'some content'})
-
-        self.assertEqual(len(view.run_command.call_args_list[1][0]), 1)
-        self.assertEqual(view.run_command.call_args_list[1][0][0], 'save')
+        # files are loaded concurrently, so the commands of the files may interleave
+        self.assertEqual(view.run_command.call_count, 2)
+        self.assertCountEqual([call[0] for call in view.run_command.call_args_list], [
+            ('append', {'characters': 'some content', 'force': True}),
+            ('append', {'characters': 'another content', 'force': True}),
+        ])
 
         self.assertEqual(view.set_scratch.call_count, 2)
         view.set_scratch.assert_called_with(True)
 
         self.assertEqual(view.retarget.call_count, 2)
-
-        self.assertEqual(view.settings.return_value.set.call_count, 2)
-        view.settings.return_value.set.assert_called_with('do-update', False)
+        view.retarget.assert_called_with(gist.gist_mirror.path('gist6', 'some_file2.txt'))
+        self.assertEqual(mocked_gist_mirror_write.call_count, 2)
 
         self.assertEqual(mocked_set_syntax.call_count, 2)
         self.assertEqual(mocked_set_syntax.call_args_list[0][0][0], view)
@@ -105,10 +263,10 @@ class TestGist(TestCase):
                          github_api.GIST_WITH_FILE_CONTENT_AND_TYPE['files']['some_file1.txt'])
 
     @patch('test.stubs.sublime.Window.active_view')
-    @patch('gist_80.api_request')
-    def test_insert_gist(self, mocked_api_request, mocked_active_view):
+    @patch('gist_80.fetch_gist')
+    def test_insert_gist(self, mocked_fetch_gist, mocked_active_view):
         gist_url = 'some gist url'
-        mocked_api_request.return_value = github_api.GIST_WITH_FILE_CONTENT_AND_TYPE
+        mocked_fetch_gist.return_value = github_api.GIST_WITH_FILE_CONTENT_AND_TYPE
         view = Mock()
         mocked_active_view.return_value = view
 
@@ -126,11 +284,40 @@ class TestGist(TestCase):
         gist.insert_gist(gist_url)
         self.assertEqual(view.settings.return_value.set.call_count, 6)
 
+    @patch('gist_80.gist_mirror.write')
+    @patch('gist_80.set_syntax')
+    @patch('gist_80.gistify_view')
+    @patch('gist_62_sync.api_request_raw')
     @patch('test.stubs.sublime.Window.active_view')
-    @patch('gist_80.api_request')
-    def test_insert_gist_embed(self, mocked_api_request, mocked_active_view):
+    @patch('test.stubs.sublime.Window.new_file')
+    @patch('gist_80.fetch_gist')
+    def test_truncated_file(self, mocked_fetch_gist, mocked_new_file, mocked_active_view, mocked_fetch_gist_raw, *_):
+        gist.plugin_loaded()
+        mocked_fetch_gist.return_value = github_api.GIST_WITH_TRUNCATED_FILE
+        view = Mock()
+        mocked_new_file.return_value = view
+        mocked_active_view.return_value = view
+        view.settings.return_value.get.return_value = False  # auto_indent is False
+
+        mocked_fetch_gist_raw.return_value = iter(['first chunk', 'second chunk'])
+        gist.open_gist(github_api.GIST_WITH_TRUNCATED_FILE['url'])
+        mocked_fetch_gist_raw.assert_called_with('some raw url')
+        self.assertEqual(view.run_command.call_args_list[0][0], ('append', {'characters': 'first chunk', 'force': True}))
+        self.assertEqual(view.run_command.call_args_list[1][0], ('append', {'characters': 'second chunk', 'force': True}))
+
+        view.reset_mock()
+        mocked_fetch_gist_raw.return_value = iter(['first chunk', 'second chunk'])
+        gist.insert_gist(github_api.GIST_WITH_TRUNCATED_FILE['url'])
+        self.assertEqual(view.run_command.call_args_list, [
+            (('insert', {'characters': 'first chunk'}),),
+            (('insert', {'characters': 'second chunk'}),),
+        ])
+
+    @patch('test.stubs.sublime.Window.active_view')
+    @patch('gist_80.fetch_gist')
+    def test_insert_gist_embed(self, mocked_fetch_gist, mocked_active_view):
         gist_url = 'some gist url'
-        mocked_api_request.return_value = github_api.GIST_WITH_RAW_URL
+        mocked_fetch_gist.return_value = github_api.GIST_WITH_RAW_URL
         view = Mock()
         mocked_active_view.return_value = view
 
@@ -158,16 +345,154 @@ class TestGist(TestCase):
         mocked_copy.assert_called_with('Gist/Gist.sublime-settings', 'User/Gist.sublime-settings')
         mocked_open_file.assert_called_with('User/Gist.sublime-settings')
 
+        sublime.error_message.reset_mock()
+        gist.catch_errors(lambda: exec('raise(gist.HostUnavailable("github.domain.test"))'))()
+        sublime.error_message.assert_called_with('Gist: github.domain.test is not responding, try again later')
+
+        sublime.error_message.reset_mock()
+        gist.catch_errors(lambda: exec('raise(gist.RateLimitExceeded(None))'))()
+        sublime.error_message.assert_called_with('Gist: GitHub API rate limit exceeded, '
+                                                 'it is reset at the top of the hour')
+        self.assertEqual(mocked_print_exc.call_count, 1)
+
+    @patch('gist_80.rate_limiter')
+    def test_show_rate_limit(self, mocked_rate_limiter):
+        view = sublime.View()
+        view.set_status = Mock()
+
+        mocked_rate_limiter.latest = (None, None, None)
+        gist.GistListener().on_activated(view)
+        self.assertEqual(view.set_status.call_count, 0)
+
+        mocked_rate_limiter.latest = (4321, 5000, 1600000000)
+        gist.GistListener().on_activated(view)
+        view.set_status.assert_called_with('Gist Rate Limit', 'GitHub API: 4321/5000')
+
+    @patch('gist_80.parallel_map', side_effect=lambda fn, items: [fn(items[0])])
+    @patch('gist_80.set_syntax')
+    @patch('gist_80.gistify_view')
+    @patch('gist_62_sync.api_request_raw')
+    @patch('gist_80.fetch_gist')
+    def test_failed_open_gist_leaves_no_gist_views(self, mocked_fetch_gist, mocked_api_request_raw, *_):
+        gist.plugin_loaded()
+        mocked_fetch_gist.return_value = {'id': 'gist', 'url': 'some gist url', 'files': dict(
+            ('file{}.txt'.format(num), {'type': 'text/plain', 'raw_url': 'raw url', 'truncated': True})
+            for num in range(2)
+        )}
+        mocked_api_request_raw.side_effect = OSError('connection reset')
+
+        # the first file fails, the load of the second one never starts
+        views = [Mock(), Mock()]
+        with patch('test.stubs.sublime.Window.new_file', side_effect=views):
+            self.assertRaises(OSError, gist.open_gist, 'some gist url')
+
+        views[0].settings().erase.assert_any_call('gist_url')
+        self.assertFalse(views[0].window().run_command.called)
+        views[1].window().run_command.assert_called_with('close_file')
+
+    @patch('gist_80.gist_mirror.write')
+    @patch('gist_80.set_syntax')
+    @patch('gist_80.gistify_view')
+    @patch('gist_62_sync.api_request_raw')
+    @patch('gist_80.fetch_gist')
+    def test_open_gist_downloads_files_concurrently(self, mocked_fetch_gist, mocked_api_request_raw, *_):
+        gist.plugin_loaded()
+        mocked_fetch_gist.return_value = {'id': 'gist', 'url': 'some gist url', 'files': dict(
+            ('file{}.txt'.format(num), {'type': 'text/plain', 'raw_url': 'raw url {}'.format(num), 'truncated': True})
+            for num in range(2)
+        )}
+        both_started = threading.Barrier(2, timeout=5)
+
+        def download(raw_url):
+            both_started.wait()  # breaks when the downloads run one after another
+            yield raw_url
+
+        mocked_api_request_raw.side_effect = download
+        views = [Mock(), Mock()]
+        with patch('test.stubs.sublime.Window.new_file', side_effect=views):
+            gist.open_gist('some gist url')
+
+        # views are opened in the order of files
+        views[0].run_command.assert_any_call('append', {'characters': 'raw url 0', 'force': True})
+        views[1].run_command.assert_any_call('append', {'characters': 'raw url 1', 'force': True})
+
+    @patch('gist_62_sync.api_request_raw')
+    def test_closed_view_stops_download(self, mocked_api_request_raw):
+        gist.plugin_loaded()
+        view = sublime.View()
+        gist_data = {'id': 'gist', 'url': 'some gist url', 'files': {
+            'large.txt': {'type': 'text/plain', 'content': 'part', 'truncated': True, 'raw_url': 'some raw url'},
+        }}
+
+        def download(raw_url):
+            yield 'first chunk'
+            gist.GistListener().on_close(view)
+            if gist_request.request_option('cancelled').is_set():
+                raise gist.RequestCancelled()
+            yield 'never loaded'
+
+        mocked_api_request_raw.side_effect = download
+
+        self.assertIsNone(gist.load_gist_file(view, gist_data, 'large.txt'))
+        self.assertFalse(gist.is_synced('some gist url', 'large.txt', 'first chunk'))
+        self.assertEqual(gist.loading_views, {})
+
+    @patch('test.stubs.sublime.set_timeout')
+    def test_view_loader(self, mocked_set_timeout):
+        view = sublime.View()
+        loader = gist_helpers.ViewLoader(view, 'some_log.txt', size=10)
+        loader.slice_size = 4
+        self.assertTrue(view.is_read_only())
+
+        loader.write('0123456789')
+        on_done = Mock()
+        loader.close(on_done)
+
+        # nothing is appended until the UI thread runs the callback, every slice schedules the next one
+        self.assertEqual(view._run_command.call_count, 0)
+        self.assertEqual(mocked_set_timeout.call_count, 1)
+
+        mocked_set_timeout.call_args[0][0]()
+        view._run_command.assert_called_with('append', args={'characters': '0123', 'force': True})
+        sublime.status_message.assert_called_with('Gist: loading some_log.txt 40%')
+        self.assertEqual(mocked_set_timeout.call_count, 2)
+
+        for _ in range(4):
+            mocked_set_timeout.call_args[0][0]()
+        self.assertEqual([call[1]['args']['characters'] for call in view._run_command.call_args_list],
+                         ['0123', '4567', '89'])
+        self.assertFalse(view.is_read_only())
+        on_done.assert_called_with()
+
+        # the chain stops when nothing is pending and starts again with the next write
+        self.assertEqual(mocked_set_timeout.call_count, 5)
+        loader.write('more')
+        self.assertEqual(mocked_set_timeout.call_count, 6)
+
+    @patch('test.stubs.sublime.set_timeout')
+    def test_view_loader_waits_for_ui(self, mocked_set_timeout):
+        view = sublime.View()
+        loader = gist_helpers.ViewLoader(view, 'some_log.txt')
+        loader.slice_size = 1
+        loader.pending = gist_helpers.queue.Queue(2)
+
+        writer = threading.Thread(target=loader.write, args=('0123',))
+        writer.start()
+        writer.join(0.2)
+        self.assertTrue(writer.is_alive())  # only two slices fit into the queue
+
+        while writer.is_alive() or not loader.pending.empty():
+            mocked_set_timeout.call_args[0][0]()
+            writer.join(0.01)
+        self.assertEqual([call[1]['args']['characters'] for call in view._run_command.call_args_list],
+                         ['0', '1', '2', '3'])
+
     @patch('gist_60_helpers.gist_title')
     def test_gistify_view(self, mocked_gist_title):
         mocked_gist_title.return_value = ['some gist title']
         view = sublime.View()
         gist_filename = 'some filename'
-        gist = {
-            'html_url': 'some html url',
-            'description': 'some description',
-            'url': 'some url'
-        }
+        gist = GistSummary('some id', url='some url', html_url='some html url', description='some description')
 
         gist_helpers.gistify_view(view, gist, gist_filename)
 
@@ -208,17 +533,66 @@ class TestGist(TestCase):
         sublime.settings_storage['Gist.sublime-settings'].set('gist_prefix', 'some_prefix:')
         sublime.settings_storage['Gist.sublime-settings'].set('gist_tag', 'some_tag')
 
-        all_gists = [
+        all_gists = [GistSummary.from_json(gist_data) for gist_data in [
             {'description': 'some gist 1', 'files': {}},
             {'description': 'some_prefix:some gist 2', 'files': {'some_test.sh': {}}},
             {'description': 'some_prefix:some gist 3 #some_tag', 'files': {'some_test2.sh': {}}},
-        ]
+        ]]
 
         gists, gists_names = gist_helpers.gists_filter(all_gists)
 
-        self.assertEqual(gists, [{'files': {'some_test2.sh': {}}, 'description': 'some_prefix:some gist 3 #some_tag'}])
+        self.assertEqual(gists, [all_gists[2]])
         self.assertEqual(gists_names, [['some gist 3']])
 
+    def test_gist_summary(self):
+        data = {
+            'id': 'some id',
+            'url': 'some url',
+            'html_url': 'some html url',
+            'description': 'some description',
+            'owner': {'login': 'some_user', 'avatar_url': 'not kept'},
+            'updated_at': '2020-01-01T00:00:00Z',
+            'files': {'some_file.py': {'type': 'application/x-python', 'language': 'Python', 'size': 12,
+                                       'raw_url': 'not kept'}},
+            'comments': 0,
+        }
+
+        summary = GistSummary.from_json(data)
+
+        self.assertEqual(summary.owner_login, 'some_user')
+        self.assertEqual([gist_file.filename for gist_file in summary.files], ['some_file.py'])
+        self.assertFalse(hasattr(summary, '__dict__'))
+        self.assertFalse(hasattr(summary.files[0], '__dict__'))
+
+        trimmed = summary.to_json()
+        self.assertNotIn('comments', trimmed)
+        self.assertEqual(trimmed['files'], {'some_file.py': {'type': 'application/x-python', 'language': 'Python',
+                                                             'size': 12}})
+        self.assertEqual(GistSummary.from_json(trimmed).to_json(), trimmed)
+        self.assertIsNone(GistSummary.from_json({'id': 'anonymous', 'owner': None}).owner_login)
+
+    def test_gist_summary_from_graphql(self):
+        summary = GistSummary.from_graphql({
+            'name': 'some id',
+            'url': 'some html url',
+            'description': None,
+            'updatedAt': '2020-01-01T00:00:00Z',
+            'owner': {'login': 'some_user'},
+            'files': [{'name': 'some_file.py', 'size': 12, 'language': {'name': 'Python'}},
+                      {'name': 'some_file.unknown', 'size': 1, 'language': None}],
+        }, 'https://api.github.test')
+
+        self.assertEqual(summary.to_json(), {
+            'id': 'some id',
+            'url': 'https://api.github.test/gists/some id',
+            'html_url': 'some html url',
+            'description': None,
+            'owner': {'login': 'some_user'},
+            'updated_at': '2020-01-01T00:00:00Z',
+            'files': {'some_file.py': {'type': None, 'language': 'Python', 'size': 12},
+                      'some_file.unknown': {'type': None, 'language': None, 'size': 1}},
+        })
+
     @patch('gist_80.os.name', 'nt')
     def test_set_syntax(self):
         view = Mock()
@@ -243,47 +617,40 @@ class TestGist(TestCase):
 
         self.assertEqual(gist_request.token_auth_string(), 'some token')
 
-    @patch('gist_40_request.urllib')
-    def test_api_request(self, mocked_urllib):
-        url = 'https://url.test'
+    @patch('gist_40_request.get_transport')
+    def test_api_request(self, mocked_get_transport):
+        url = 'https://url.test/some/path?some=query'
         data = 'some data'
         token = 'some token'
         https_proxy = 'some https proxy'
         method = 'some method'
 
-        mocked_urllib.urlopen().read.return_value = b'{"some": "response"}'
+        response = Mock()
+        response.status = 200
+        transport = mocked_get_transport.return_value
+        transport.request.return_value = (response, b'{"some": "response"}')
 
         result = gist_request.api_request(url, data, token, https_proxy, method)
 
-        mocked_urllib.Request.assert_called_with(url)
-
-        self.assertEqual(mocked_urllib.Request().add_header.call_count, 3)
-        self.assertEqual(mocked_urllib.Request().add_header.call_args_list[0][0][0], 'Authorization')
-        self.assertEqual(mocked_urllib.Request().add_header.call_args_list[0][0][1], 'token some token')
-        self.assertEqual(mocked_urllib.Request().add_header.call_args_list[1][0][0], 'Accept')
-        self.assertEqual(mocked_urllib.Request().add_header.call_args_list[1][0][1], 'application/json')
-        self.assertEqual(mocked_urllib.Request().add_header.call_args_list[2][0][0], 'Content-Type')
-        self.assertEqual(mocked_urllib.Request().add_header.call_args_list[2][0][1], 'application/json')
-
-        mocked_urllib.Request().add_data.assert_called_with(b'some data')
-
-        mocked_urllib.build_opener.assert_called_with(mocked_urllib.HTTPHandler(), mocked_urllib.HTTPSHandler(),
-                                                      mocked_urllib.ProxyHandler())
-
-        mocked_urllib.install_opener.assert_called_with(mocked_urllib.build_opener())
+        mocked_get_transport.assert_called_with('some https proxy')
+        transport.request.assert_called_with(('https', 'url.test'), 'some method', '/some/path?some=query',
+                                             b'some data', {
+                                                 'Authorization': 'token some token',
+                                                 'Accept': 'application/json',
+                                                 'Content-Type': 'application/json',
+                                             })
 
         self.assertEqual(result, {'some': 'response'})
 
         # no content flow, do nothing
-        mocked_urllib.urlopen().code = 204
+        response.status = 204
 
         result = gist_request.api_request(url, data, token, https_proxy, method)
 
         self.assertIsNone(result)
 
-        # HTTPException flow
-        mocked_urllib.HTTPError = HTTPError
-        mocked_urllib.urlopen.side_effect = HTTPError(url, 'some code', 'some msg', 'some headers',
-                                                      StringIO('some error data'))
+        # HTTP error flow
+        response.status = 404
+        transport.request.return_value = (response, b'some error data')
 
         self.assertRaises(SimpleHTTPError, gist_request.api_request, url, data, token)
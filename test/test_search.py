@@ -0,0 +1,229 @@
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+from gist_20_exceptions import SimpleHTTPError
+from gist_30_models import GistSummary
+from gist_70_search import ContentIndex, SearchIndex, content_words, gist_words, trigrams
+from gist_75_index import index_gist
+
+
+def make_gist(gist_id, description, files, login='some_user', updated_at='2020-01-01T00:00:00Z'):
+    return GistSummary.from_json({
+        'id': gist_id,
+        'url': 'https://api.github.test/gists/' + gist_id,
+        'description': description,
+        'owner': {'login': login},
+        'updated_at': updated_at,
+        'files': dict((filename, {'language': language}) for filename, language in files.items()),
+    })
+
+
+GISTS = [
+    make_gist('gist1', 'Deploy script for staging', {'deploy.sh': 'Shell'}),
+    make_gist('gist2', 'Python retry decorator', {'retry.py': 'Python', 'test_retry.py': 'Python'}),
+    make_gist('gist3', None, {'nginx.conf': None}, login='ops_team'),
+]
+
+
+class TestSearchIndex(TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.update((gist, [gist.id]) for gist in GISTS)
+
+    def search_ids(self, query):
+        return [gist.id for gist, _ in self.index.search(query)]
+
+    def test_words(self):
+        self.assertEqual(trigrams('py'), {' py', 'py '})
+        self.assertEqual(list(gist_words(GISTS[2])), ['nginx', 'conf', 'ops', 'team'])
+
+    def test_search(self):
+        self.assertEqual(self.search_ids('deploy'), ['gist1'])
+        self.assertEqual(self.search_ids('DEPLOY.SH'), ['gist1'])
+        self.assertEqual(self.search_ids('retry python'), ['gist2'])
+        self.assertEqual(self.search_ids('ops'), ['gist3'])  # owner login
+        self.assertEqual(self.search_ids('shell'), ['gist1'])  # language
+        self.assertEqual(self.search_ids('deploy python'), [])  # all words must match
+        self.assertEqual(self.search_ids('nothing'), [])
+        self.assertEqual(self.search_ids(''), ['gist1', 'gist2', 'gist3'])
+
+    def test_fuzzy_search(self):
+        self.assertEqual(self.search_ids('pyth'), ['gist2'])  # partial word
+        self.assertEqual(self.search_ids('decorater'), ['gist2'])  # misspelled word
+        self.assertEqual(self.search_ids('ngin'), ['gist3'])
+
+    def test_ranking(self):
+        self.index.update([
+            (make_gist('partial', 'staging environment', {'a.txt': None}), ['partial']),
+            (make_gist('whole', 'stage', {'b.txt': None}), ['whole']),
+        ])
+        self.assertEqual(self.search_ids('stage'), ['whole', 'partial'])
+
+    def test_update(self):
+        entries = [(gist, [gist.id]) for gist in GISTS]
+        postings = self.index.trigram_postings
+        self.index.update(entries)
+        self.assertIs(self.index.trigram_postings, postings)  # nothing changed
+
+        # the same gist from another list is shown once
+        self.index.update(entries + [(GISTS[0], ['★ gist1'])])
+        self.assertEqual(self.index.search('deploy'), [(GISTS[0], ['gist1'])])
+
+        changed = make_gist('gist1', 'Release script', {'release.sh': 'Shell'}, updated_at='2021-01-01T00:00:00Z')
+        self.index.update([(changed, ['gist1'])] + entries[1:])
+        self.assertEqual(self.search_ids('deploy'), [])
+        self.assertEqual(self.search_ids('release'), ['gist1'])
+
+    def test_many_gists(self):
+        self.index.update(
+            (make_gist('gist{}'.format(num), 'snippet number {}'.format(num), {'file{}.py'.format(num): 'Python'}),
+             ['gist{}'.format(num)])
+            for num in range(20000)
+        )
+
+        started = time.time()
+        results = self.index.search('snippet 12345', limit=10)
+        self.assertLess(time.time() - started, 1)
+        self.assertEqual(results[0][0].id, 'gist12345')
+        self.assertEqual(len(results), 10)
+
+
+class TestContentIndex(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.index = ContentIndex(os.path.join(self.directory.name, 'Gist Index', 'contents.json'))
+        self.index.load()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def search_ids(self, query, index=None):
+        return [gist.id for gist in (index or self.index).search(query)]
+
+    def test_content_words(self):
+        self.assertEqual(content_words(['def ret', 'ry(func', '):\n    pass']), {'def', 'retry', 'func', 'pass'})
+        self.assertEqual(content_words([]), set())
+
+    def test_search(self):
+        older = make_gist('older', 'older', {'a.py': 'Python'}, updated_at='2019-01-01T00:00:00Z')
+        newer = make_gist('newer', 'newer', {'b.py': 'Python'}, updated_at='2020-01-01T00:00:00Z')
+        self.index.update([(older, {'import', 'requests'}), (newer, {'import', 'json'})])
+
+        self.assertEqual(self.search_ids('import'), ['newer', 'older'])
+        self.assertEqual(self.search_ids('IMPORT json'), ['newer'])
+        self.assertEqual(self.search_ids('req'), ['older'])  # words are matched by prefix
+        self.assertEqual(self.search_ids('import xml'), [])
+        self.assertEqual(self.search_ids(''), [])
+
+        # changed gist replaces its old words, removed gist is dropped
+        self.index.update([(newer, {'yaml'})], removed_ids=['older'])
+        self.assertEqual(self.search_ids('import'), [])
+        self.assertEqual(self.search_ids('yaml'), ['newer'])
+        self.assertEqual(self.index.search('yaml')[0].files[0].filename, 'b.py')
+
+    def test_save_load(self):
+        gist = make_gist('gist1', 'some gist', {'a.py': 'Python'})
+        self.index.update([(gist, {'some', 'words'})])
+        self.index.save()
+
+        loaded = ContentIndex(self.index.path)
+        loaded.load()
+        self.assertEqual(self.search_ids('words', loaded), ['gist1'])
+        self.assertEqual(loaded.outdated([gist]), [])
+
+        # broken file gives an empty index
+        with open(self.index.path, 'w') as f:
+            f.write('{')
+        broken = ContentIndex(self.index.path)
+        broken.load()
+        self.assertEqual(broken.gists, {})
+
+    def test_refresh(self):
+        indexed = make_gist('indexed', 'indexed', {'a.py': None})
+        changed = make_gist('changed', 'changed', {'b.py': None})
+        deleted = make_gist('deleted', 'deleted', {'c.py': None})
+        self.index.update([(indexed, {'old'}), (changed, {'old'}), (deleted, {'old'})])
+
+        changed = make_gist('changed', 'changed', {'b.py': None}, updated_at='2021-01-01T00:00:00Z')
+        failed = make_gist('failed', 'failed', {'d.py': None})
+        index_gist = Mock(side_effect=lambda gist: None if gist is failed else (gist, {'new'}))
+        on_progress = Mock()
+
+        self.index.refresh([indexed, changed, changed, failed], index_gist, on_progress, batch_size=1)
+
+        self.assertCountEqual([call[0][0].id for call in index_gist.call_args_list], ['changed', 'failed'])
+        self.assertEqual(on_progress.call_args_list[-1][0], (2, 2))
+        self.assertEqual(self.search_ids('old'), ['indexed'])
+        self.assertEqual(self.search_ids('new'), ['changed'])
+        self.assertNotIn('deleted', self.index.gists)
+        self.assertTrue(os.path.exists(self.index.path))
+
+    def test_refresh_saves_once_per_interval(self):
+        gists = [make_gist('gist{}'.format(number), 'gist', {'a.py': None}) for number in range(5)]
+
+        with patch.object(self.index, 'save') as mocked_save:
+            self.index.refresh(gists, lambda gist: (gist, {'word'}), batch_size=1)
+            self.assertEqual(mocked_save.call_count, 1)  # the whole index is written at the end only
+
+            mocked_save.reset_mock()
+            self.index.refresh(gists, lambda gist: (gist, {'word'}), batch_size=1)
+            self.assertEqual(mocked_save.call_count, 0)  # nothing changed
+
+            changed = [make_gist(gist.id, 'gist', {'a.py': None}, updated_at='2021-01-01T00:00:00Z') for gist in gists]
+            self.index.refresh(changed, lambda gist: (gist, {'word'}), batch_size=1, save_interval=0)
+            self.assertEqual(mocked_save.call_count, 6)
+
+    def test_search_while_saving(self):
+        self.index.update([(make_gist('gist1', 'some gist', {'a.py': None}), {'words'})])
+        writing = threading.Event()
+        finish = threading.Event()
+        dump = json.dump
+
+        def slow_dump(data, f):
+            writing.set()
+            finish.wait(5)
+            dump(data, f)
+
+        with patch('gist_70_search.json.dump', side_effect=slow_dump):
+            saving = threading.Thread(target=self.index.save)
+            saving.start()
+            self.assertTrue(writing.wait(5))
+            # the index is not locked while the file is written
+            self.assertEqual(self.search_ids('words'), ['gist1'])
+            finish.set()
+            saving.join()
+
+        loaded = ContentIndex(self.index.path)
+        loaded.load()
+        self.assertEqual(self.search_ids('words', loaded), ['gist1'])
+
+
+class TestIndexGist(TestCase):
+    @patch('gist_75_index.traceback.print_exc')
+    @patch('gist_62_sync.api_request_raw')
+    @patch('gist_75_index.api_request')
+    def test_index_gist(self, mocked_api_request, mocked_api_request_raw, mocked_print_exc):
+        mocked_api_request.return_value = {
+            'id': 'gist', 'description': 'some description', 'owner': {'login': 'some_user'},
+            'files': {
+                'small.py': {'type': 'application/x-python', 'content': 'import json', 'language': 'Python'},
+                'large.log': {'type': 'text/plain', 'content': 'part', 'truncated': True, 'raw_url': 'some raw url'},
+                'image.png': {'type': 'image/png', 'content': 'binary'},
+            }
+        }
+        mocked_api_request_raw.return_value = iter(['partial ', 'content'])
+
+        summary, found = index_gist(GistSummary('gist', url='some gist url'))
+        mocked_api_request.assert_called_with('some gist url')
+        self.assertEqual([gist_file.filename for gist_file in summary.files], ['small.py', 'large.log', 'image.png'])
+        self.assertEqual(found, {'some', 'description', 'small', 'py', 'python', 'large', 'log', 'image', 'png',
+                                 'user', 'import', 'json', 'partial', 'content'})
+
+        mocked_api_request.side_effect = SimpleHTTPError('404: Not Found')
+        self.assertIsNone(index_gist(GistSummary('gist', url='some gist url')))
+        self.assertEqual(mocked_print_exc.call_count, 1)
@@ -3,18 +3,19 @@ from unittest.mock import patch
 
 import gist_60_helpers as gist_helpers
 import gist_80 as gist
+from gist_30_models import GistSummary
 from test.stubs import github_api, sublime
 
 DEFAULT_GISTS_URL = 'https://api.github.com/gists?per_page=100'
 DEFAULT_USER_GISTS_URL = 'https://api.github.com/users/%s/gists?per_page=100'
 DEFAULT_STARRED_GISTS_URL = 'https://api.github.com/gists/starred?per_page=100'
-DEFAULT_ORGS_URL = 'https://api.github.com/user/orgs'
+DEFAULT_ORGS_URL = 'https://api.github.com/user/orgs?per_page=100'
 
 CUSTOM_API_URL = 'https://github.domain.test/api/v3'
 CUSTOM_GISTS_URL = 'https://github.domain.test/api/v3/gists?per_page=80'
 CUSTOM_USER_GISTS_URL = 'https://github.domain.test/api/v3/users/%s/gists?per_page=80'
 CUSTOM_STARRED_GISTS_URL = 'https://github.domain.test/api/v3/gists/starred?per_page=80'
-CUSTOM_ORGS_URL = 'https://github.domain.test/api/v3/user/orgs'
+CUSTOM_ORGS_URL = 'https://github.domain.test/api/v3/user/orgs?per_page=100'
 
 
 class TestGistSettings(TestCase):
@@ -41,16 +42,30 @@ class TestGistSettings(TestCase):
         self.assertEqual(gist.settings.get('STARRED_GISTS_URL'), CUSTOM_STARRED_GISTS_URL)
         self.assertEqual(gist.settings.get('ORGS_URL'), CUSTOM_ORGS_URL)
 
-    @patch('gist_80.sublime.status_message')
-    def test_max_gists(self, patched_status_message):
-        gist.settings.set('max_gists', 101)
+    def test_max_gists(self):
+        gist.settings.set('max_gists', 5000)
         gist.set_settings()
-        self.assertEqual(gist.settings.get('max_gists'), 100)
-        patched_status_message.assert_called_with('Gist: GitHub API does not support a value of higher than 100')
+        self.assertEqual(gist.settings.get('max_gists'), 5000)
+        self.assertEqual(gist.settings.get('GISTS_URL'), DEFAULT_GISTS_URL)  # the rest is fetched page by page
 
         gist.settings.set('max_gists', 42)
         gist.set_settings()
         self.assertEqual(gist.settings.get('max_gists'), 42)
+        self.assertEqual(gist.settings.get('GISTS_URL'), 'https://api.github.com/gists?per_page=42')
+
+    @patch('gist_80.reset_transports')
+    def test_https_proxy_change(self, mocked_reset_transports):
+        gist.set_settings()
+        self.assertEqual(mocked_reset_transports.call_count, 0)
+
+        gist.settings.set('https_proxy', 'http://proxy.test:3128')
+        gist.set_settings()
+        gist.set_settings()
+        self.assertEqual(mocked_reset_transports.call_count, 1)
+
+        gist.settings.set('https_proxy', '')
+        gist.set_settings()
+        self.assertEqual(mocked_reset_transports.call_count, 2)
 
     def test_prefer_filename(self):
         settings = sublime.load_settings('Gist.sublime-settings')
@@ -58,22 +73,22 @@ class TestGistSettings(TestCase):
 
         # prefer_filename = False and with description - prefer description
         settings.set('prefer_filename', False)
-        result = gist_helpers.gist_title(github_api.GIST_WITH_DESCRIPTION)
+        result = gist_helpers.gist_title(GistSummary.from_json(github_api.GIST_WITH_DESCRIPTION))
         self.assertEqual(result, ['some description'])
 
         # prefer_filename = True and with description - prefer one of file names
         settings.set('prefer_filename', True)
-        result = gist_helpers.gist_title(github_api.GIST_WITH_DESCRIPTION)
+        result = gist_helpers.gist_title(GistSummary.from_json(github_api.GIST_WITH_DESCRIPTION))
         self.assertIn(result, (['some_file.txt'], ['another_file.cpp']))
 
         # prefer_filename = True and without description - prefer one of file names
         settings.set('prefer_filename', False)
-        result = gist_helpers.gist_title(github_api.GIST_WITHOUT_DESCRIPTION)
+        result = gist_helpers.gist_title(GistSummary.from_json(github_api.GIST_WITHOUT_DESCRIPTION))
         self.assertIn(result, (['some_file.txt'], ['another_file.cpp']))
 
         # prefer_filename = False and without description - still prefer one of file names
         settings.set('prefer_filename', True)
-        result = gist_helpers.gist_title(github_api.GIST_WITHOUT_DESCRIPTION)
+        result = gist_helpers.gist_title(GistSummary.from_json(github_api.GIST_WITHOUT_DESCRIPTION))
         self.assertIn(result, (['some_file.txt'], ['another_file.cpp']))
 
     def test_show_authors(self):
@@ -81,31 +96,36 @@ class TestGistSettings(TestCase):
         settings.set('prefer_filename', False)
 
         settings.set('show_authors', False)
-        result = gist_helpers.gist_title(github_api.GIST_WITH_DESCRIPTION)
+        result = gist_helpers.gist_title(GistSummary.from_json(github_api.GIST_WITH_DESCRIPTION))
         self.assertEqual(result, ['some description'])
 
         settings.set('show_authors', True)
-        result = gist_helpers.gist_title(github_api.GIST_WITH_DESCRIPTION)
+        result = gist_helpers.gist_title(GistSummary.from_json(github_api.GIST_WITH_DESCRIPTION))
         self.assertEqual(result, ['some description', 'some_user'])
 
+    @patch('gist_80.GistListCommandBase.debounce_delay', 0)
+    @patch('gist_62_sync.disk_cache')
     @patch('gist_80.GistListCommandBase.get_window')
-    @patch('gist_80.api_request')
-    def test_use_starred(self, mocked_api_request, mocked_get_window):
+    @patch('gist_62_sync.api_request_pages')
+    def test_use_starred(self, mocked_api_request_pages, mocked_get_window, mocked_disk_cache):
         gist.plugin_loaded()
-        mocked_api_request.side_effect = [github_api.GIST_STARRED_LIST, github_api.GIST_LIST]
+        mocked_disk_cache.get.return_value = (None, False)
+        mocked_api_request_pages.side_effect = lambda url, max_items=None: iter([{
+            DEFAULT_STARRED_GISTS_URL: github_api.GIST_STARRED_LIST,
+            DEFAULT_GISTS_URL: github_api.GIST_LIST,
+        }[url]])
         gist_list_base = gist.GistListCommandBase()
 
         gist_list_base.run()
-        self.assertEqual(mocked_api_request.call_count, 2)
-        self.assertEqual(mocked_api_request.mock_calls[0][1], (DEFAULT_STARRED_GISTS_URL,))
-        self.assertEqual(mocked_api_request.mock_calls[1][1], (DEFAULT_GISTS_URL,))
+        self.assertEqual(mocked_api_request_pages.call_count, 2)
+        self.assertCountEqual([mock_call[1] for mock_call in mocked_api_request_pages.mock_calls],
+                              [(DEFAULT_STARRED_GISTS_URL, 100), (DEFAULT_GISTS_URL, 100)])
 
-        mocked_api_request.reset_mock()
-        mocked_api_request.side_effect = [github_api.GIST_STARRED_LIST]
+        mocked_api_request_pages.reset_mock()
         gist.settings.set('use_starred', True)
         gist_list_base.run()
-        self.assertEqual(mocked_api_request.call_count, 1)
-        self.assertEqual(mocked_api_request.mock_calls[0][1], (DEFAULT_STARRED_GISTS_URL,))
+        self.assertEqual(mocked_api_request_pages.call_count, 1)
+        self.assertEqual(mocked_api_request_pages.mock_calls[0][1], (DEFAULT_STARRED_GISTS_URL, 100))
 
 
     # TODO: test: supress_save_dialog, update_on_save (see test_open_gist)
@@ -0,0 +1,210 @@
+from unittest import TestCase
+from unittest.mock import Mock, patch
+
+import gist_62_sync as gist_sync
+import gist_80 as gist
+from gist_30_models import GistSummary
+from test.stubs import github_api
+
+
+class TestSync(TestCase):
+    def setUp(self):
+        gist_sync.disk_cache.clear()
+
+    @patch('gist_62_sync.threading.Thread')
+    @patch('gist_62_sync.api_request_pages')
+    def test_cached_api_request(self, mocked_api_request_pages, mocked_thread):
+        gist.plugin_loaded()
+        url = 'some list url'
+        mocked_api_request_pages.return_value = iter([github_api.GIST_LIST[:1], github_api.GIST_LIST[1:]])
+
+        self.assertEqual(gist_sync.cached_api_request(url), github_api.GIST_LIST)
+        self.assertEqual(mocked_api_request_pages.call_count, 1)
+
+        # fresh cache, no request
+        self.assertEqual(gist_sync.cached_api_request(url), github_api.GIST_LIST)
+        self.assertEqual(mocked_api_request_pages.call_count, 1)
+        self.assertEqual(mocked_thread.call_count, 0)
+
+        # stale cache is returned at once and refreshed in background
+        gist_sync.disk_cache.invalidate(gist_sync.cache_key(url))
+        mocked_api_request_pages.return_value = iter([github_api.GIST_STARRED_LIST])
+        self.assertEqual(gist_sync.cached_api_request(url), github_api.GIST_LIST)
+        self.assertEqual(mocked_api_request_pages.call_count, 1)
+
+        refresh = mocked_thread.call_args[1]['target']
+        refresh()
+        self.assertEqual(mocked_api_request_pages.call_count, 2)
+        self.assertEqual(gist_sync.cached_api_request(url), github_api.GIST_STARRED_LIST)
+
+        # failed refresh keeps the stale data
+        gist_sync.disk_cache.invalidate(gist_sync.cache_key(url))
+        mocked_api_request_pages.side_effect = OSError()
+        with patch('gist_62_sync.traceback.print_exc'):
+            gist_sync.cached_api_request(url)
+            mocked_thread.call_args[1]['target']()
+        self.assertEqual(gist_sync.cached_api_request(url), github_api.GIST_STARRED_LIST)
+
+    @patch('gist_62_sync.threading.Thread')
+    @patch('gist_62_sync.api_request_pages')
+    def test_own_changes_are_not_shown_stale(self, mocked_api_request_pages, mocked_thread):
+        gist.plugin_loaded()
+        url = gist.settings.get('GISTS_URL')
+        mocked_api_request_pages.return_value = iter([github_api.GIST_LIST])
+        gist_sync.cached_api_request(url)
+
+        # the list is fetched before it is shown, not refreshed in background
+        for changed in (gist_sync.invalidate_cache, lambda: gist_sync.invalidate_cache('some gist url', deleted=True)):
+            changed()
+            mocked_api_request_pages.return_value = iter([github_api.GIST_LIST[1:]])
+            self.assertEqual([item.id for item in gist_sync.cached_api_request(url)],
+                             [item['id'] for item in github_api.GIST_LIST[1:]])
+            mocked_api_request_pages.return_value = iter([github_api.GIST_LIST])
+            gist_sync.cached_api_request(url)
+        self.assertEqual(mocked_thread.call_count, 0)
+
+    @patch('gist_62_sync.threading.Thread')
+    @patch('gist_62_sync.api_request_pages')
+    def test_cached_api_request_incremental(self, mocked_api_request_pages, mocked_thread):
+        gist.plugin_loaded()
+        url = 'some incremental list url'
+        on_update = Mock()
+        mocked_api_request_pages.return_value = iter([github_api.GIST_LIST[:1], github_api.GIST_LIST[1:]])
+
+        # only the first page is waited for
+        self.assertEqual(gist_sync.cached_api_request(url, 2, on_update), github_api.GIST_LIST[:1])
+        mocked_api_request_pages.assert_called_with(url, 2)
+        self.assertEqual(on_update.call_count, 0)
+
+        mocked_thread.call_args[1]['target']()
+        on_update.assert_called_with(github_api.GIST_LIST)
+        self.assertEqual(gist_sync.cached_api_request(url, 2, on_update), github_api.GIST_LIST)
+
+        # single page, nothing to update
+        on_update.reset_mock()
+        gist_sync.disk_cache.clear()
+        mocked_api_request_pages.return_value = iter([github_api.GIST_LIST])
+        gist_sync.cached_api_request(url, 2, on_update)
+        mocked_thread.call_args[1]['target']()
+        self.assertEqual(on_update.call_count, 0)
+
+    @patch('gist_62_sync.time.time')
+    @patch('gist_62_sync.api_request_pages')
+    def test_sync_list(self, mocked_api_request_pages, mocked_time):
+        gist.plugin_loaded()
+        url = gist.settings.get('GISTS_URL')
+
+        def list_ids():
+            return [gist_summary.id for gist_summary in gist_sync.read_list(url)[0]]
+
+        first = {'id': 'first', 'updated_at': '2020-01-01T00:00:00Z'}
+        second = {'id': 'second', 'updated_at': '2020-01-02T00:00:00Z'}
+        mocked_time.return_value = 1000
+        mocked_api_request_pages.return_value = iter([[second, first]])
+
+        gist_sync.sync_list(url, 100)  # nothing is synced yet
+        mocked_api_request_pages.assert_called_with(url, 100)
+        self.assertEqual(gist_sync.disk_cache.get(gist_sync.cache_key(url))[0], [GistSummary.from_json(second).to_json(),
+                                                                      GistSummary.from_json(first).to_json()])
+        self.assertEqual(list_ids(), ['second', 'first'])
+
+        # only changed gists are requested
+        changed = dict(first, updated_at='2020-01-03T00:00:00Z')
+        new = {'id': 'new', 'updated_at': '2020-01-04T00:00:00Z'}
+        mocked_api_request_pages.return_value = iter([[new, changed]])
+        gist_sync.sync_list(url, 100)
+        mocked_api_request_pages.assert_called_with(url + '&since=2020-01-02T00:00:00Z')
+        self.assertEqual(list_ids(), ['new', 'second', 'first'])
+        self.assertEqual(gist_sync.read_list(url)[0][2].updated_at, '2020-01-03T00:00:00Z')
+
+        mocked_api_request_pages.return_value = iter([[]])
+        gist_sync.sync_list(url, 100)
+        mocked_api_request_pages.assert_called_with(url + '&since=2020-01-04T00:00:00Z')
+
+        # the whole list is fetched from time to time to drop deleted gists
+        mocked_time.return_value = 1000 + gist.settings.get('full_sync_interval')
+        mocked_api_request_pages.return_value = iter([[new]])
+        gist_sync.sync_list(url, 100)
+        mocked_api_request_pages.assert_called_with(url, 100)
+        self.assertEqual(list_ids(), ['new'])
+
+        # and after a gist was deleted here
+        mocked_api_request_pages.return_value = iter([[]])
+        gist_sync.sync_list(url, 100)
+        mocked_api_request_pages.assert_called_with(url + '&since=2020-01-04T00:00:00Z')
+        gist_sync.invalidate_cache(deleted=True)
+        mocked_api_request_pages.return_value = iter([[]])
+        gist_sync.sync_list(url, 100)
+        mocked_api_request_pages.assert_called_with(url, 100)
+
+        # newly starred gists may be older than the last sync, so starred gists are fetched whole
+        starred_url = gist.settings.get('STARRED_GISTS_URL')
+        mocked_api_request_pages.return_value = iter([[second]])
+        gist_sync.sync_list(starred_url, 100)
+        mocked_api_request_pages.return_value = iter([[second, first]])
+        gist_sync.sync_list(starred_url, 100)
+        mocked_api_request_pages.assert_called_with(starred_url, 100)
+        self.assertEqual([item.id for item in gist_sync.read_list(starred_url)[0]], ['second', 'first'])
+
+        # lists without since parameter are always fetched whole
+        members_url = 'https://api.github.test/orgs/some_org/members?per_page=100'
+        mocked_api_request_pages.return_value = iter([[{'login': 'member'}]])
+        gist_sync.sync_list(members_url)
+        mocked_api_request_pages.return_value = iter([[{'login': 'member'}]])
+        gist_sync.sync_list(members_url)
+        mocked_api_request_pages.assert_called_with(members_url, None)
+
+    def test_merge_gists(self):
+        def versions(gists):
+            return [(gist_summary.id, gist_summary.updated_at) for gist_summary in gists]
+
+        gists = [GistSummary('1', updated_at='v1'), GistSummary('2', updated_at='v1')]
+        changed = [GistSummary('2', updated_at='v2'), GistSummary('3', updated_at='v1')]
+        self.assertEqual(versions(gist_sync.merge_gists(gists, changed)), [('3', 'v1'), ('1', 'v1'), ('2', 'v2')])
+        self.assertEqual(versions(gist_sync.merge_gists(gists, changed[1:], max_items=2)), [('3', 'v1'), ('1', 'v1')])
+
+    @patch('gist_62_sync.api_response')
+    def test_fetch_gist(self, mocked_api_response):
+        gist.plugin_loaded()
+        gist_url = 'some gist url'
+        response = Mock()
+        response.getheader.side_effect = {'ETag': '"v1"'}.get
+        mocked_api_response.return_value = (github_api.GIST_WITH_RAW_URL, response)
+
+        self.assertEqual(gist_sync.fetch_gist(gist_url), github_api.GIST_WITH_RAW_URL)
+        mocked_api_response.assert_called_with(gist_url, etag=None)
+
+        # cached gist is revalidated every time, it is not downloaded again when not modified
+        mocked_api_response.return_value = (None, response)
+        self.assertEqual(gist_sync.fetch_gist(gist_url), github_api.GIST_WITH_RAW_URL)
+        mocked_api_response.assert_called_with(gist_url, etag='"v1"')
+
+        # gist changed elsewhere is never shown from the cache
+        changed = Mock()
+        changed.getheader.side_effect = {'ETag': '"v2"'}.get
+        mocked_api_response.return_value = (github_api.GIST_WITH_FILE_CONTENT_AND_TYPE, changed)
+        self.assertEqual(gist_sync.fetch_gist(gist_url), github_api.GIST_WITH_FILE_CONTENT_AND_TYPE)
+        mocked_api_response.assert_called_with(gist_url, etag='"v1"')
+
+        mocked_api_response.return_value = (None, changed)
+        self.assertEqual(gist_sync.fetch_gist(gist_url), github_api.GIST_WITH_FILE_CONTENT_AND_TYPE)
+        mocked_api_response.assert_called_with(gist_url, etag='"v2"')
+
+        # deleted gist is dropped from the cache
+        gist_sync.invalidate_cache(gist_url, deleted=True)
+        mocked_api_response.return_value = (github_api.GIST_WITH_RAW_URL, response)
+        gist_sync.fetch_gist(gist_url)
+        mocked_api_response.assert_called_with(gist_url, etag=None)
+
+    @patch('gist_62_sync.traceback.print_exc')
+    @patch('gist_62_sync.api_response')
+    def test_fetch_gist_offline(self, mocked_api_response, _):
+        gist.plugin_loaded()
+        gist_url = 'some offline gist url'
+        mocked_api_response.side_effect = OSError('network is unreachable')
+        with self.assertRaises(OSError):
+            gist_sync.fetch_gist(gist_url)
+
+        # cached gist is opened when GitHub can't be reached
+        gist_sync.disk_cache.set(gist_sync.cache_key(gist_url), github_api.GIST_WITH_RAW_URL)
+        self.assertEqual(gist_sync.fetch_gist(gist_url), github_api.GIST_WITH_RAW_URL)
@@ -0,0 +1,40 @@
+from unittest import TestCase
+from unittest.mock import Mock, call, patch
+
+from gist_65_updates import UpdateQueue
+from test.stubs import sublime
+
+
+class TestUpdateQueue(TestCase):
+    def test_update_queue(self):
+        mocked_update_gist = Mock()
+        update_queue = UpdateQueue(mocked_update_gist, delay=60)
+        self.assertFalse(update_queue.has_pending('some gist url', 'file1.txt'))
+
+        update_queue.put('some gist url', {'file1.txt': {'content': 'first'}}, 'some token')
+        self.assertTrue(update_queue.has_pending('some gist url', 'file1.txt'))
+        update_queue.put('some gist url', {'file2.txt': {'content': 'other file'}}, 'some token')
+        update_queue.put('another gist url', {'file3.txt': {'content': 'another gist'}}, 'some token')
+        update_queue.put('some gist url', {'file1.txt': {'content': 'last'}}, 'some token')
+        self.assertEqual(mocked_update_gist.call_count, 0)  # waits for the delay
+
+        self.assertTrue(update_queue.flush(timeout=5))
+        self.assertFalse(update_queue.has_pending('some gist url', 'file1.txt'))
+        self.assertEqual(mocked_update_gist.call_args_list, [
+            call('another gist url', {'file3.txt': {'content': 'another gist'}}, 'some token', None),
+            call('some gist url', {'file1.txt': {'content': 'last'}, 'file2.txt': {'content': 'other file'}},
+                 'some token', None),
+        ])
+
+        # failed update does not stop the worker
+        mocked_update_gist.reset_mock()
+        mocked_update_gist.side_effect = [Exception(), None]
+        with patch('gist_65_updates.traceback.print_exc'):
+            update_queue.put('some gist url', {'file1.txt': {'content': 'fails'}})
+            self.assertTrue(update_queue.flush(timeout=5))
+        sublime.status_message.assert_called_with('Gist: unable to update the Gist')
+
+        update_queue.delay = 0
+        update_queue.put('some gist url', {'file1.txt': {'content': 'sent'}})
+        self.assertTrue(update_queue.flush(timeout=5))
+        self.assertEqual(mocked_update_gist.call_count, 2)